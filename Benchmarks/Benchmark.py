@@ -0,0 +1,310 @@
+import os
+import sys
+import json
+import queue
+import shutil
+import resource
+import tempfile
+import subprocess
+import multiprocessing
+from time import time, strftime
+from argparse import ArgumentParser
+
+import numpy as np
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(root, "System"))
+sys.path.insert(0, os.path.join(root, "GeneratingData"))
+
+from Synthetic import write_chunks, synthetic_tricks, synthetic_max_tricks, synthetic_raw_record
+
+# Every benchmark takes the number of deals, a Generator, the path format of a synthetic corpus of that
+# many deals and the cap on deals for per-deal Python loops. It returns (seconds, items processed).
+
+def bench_bandit_decision(deals, rng, data_path, python_cap):
+	from Actors.Bandit import EpsilonBandit
+	bandit = EpsilonBandit(0.1, rng = rng)
+	options = rng.random((deals, 36))
+	prev_bid = rng.integers(-1, 35, size = deals).astype(np.int16)
+	start = time()
+	bandit.decision(options, prev_bid)
+	return time() - start, deals
+
+def loaded_manager(data_path):
+	from Actors.DataManager import DataManager
+	manager = DataManager(data_path)
+	manager.load(0)
+	return manager
+
+def bench_datamanager_load(deals, rng, data_path, python_cap):
+	from Actors.DataManager import DataManager
+	manager = DataManager(data_path)
+	start = time()
+	for chunk in range(manager.chunks):
+		manager.load(chunk)
+	return time() - start, deals
+
+def bench_datamanager_decode(deals, rng, data_path, python_cap):
+	# The float64 format decodes to views of its rows, so it is the packed format's unpacking that is timed.
+	from PackDoubleDummy import pack_vectorised
+	manager = loaded_manager(data_path)
+	rows = np.load(data_path.format(0), mmap_mode = "r")
+	raw_data = np.concatenate([pack_vectorised(rows[offset : offset + 1000000]) for offset in range(0, len(rows), 1000000)])
+	start = time()
+	manager.decode(raw_data)
+	return time() - start, len(raw_data)
+
+def bench_datamanager_concatenate_data(deals, rng, data_path, python_cap):
+	manager = loaded_manager(data_path)
+	start = time()
+	manager.concatenate_data(0)
+	return time() - start, len(manager.active)
+
+def bench_datamanager_imp(deals, rng, data_path, python_cap):
+	manager = loaded_manager(data_path)
+	manager.advance(rng.integers(1, 35, size = len(manager.active)))
+	start = time()
+	manager.IMP
+	return time() - start, len(manager.active)
+
+def bench_datamanager_pre_step(deals, rng, data_path, python_cap):
+	manager = loaded_manager(data_path)
+	start = time()
+	manager.pre_step(0)
+	return time() - start, len(manager.active)
+
+def bench_datamanager_advance(deals, rng, data_path, python_cap):
+	manager = loaded_manager(data_path)
+	bids = rng.integers(0, 36, size = len(manager.active))
+	start = time()
+	manager.advance(bids)
+	return time() - start, len(bids)
+
+def bench_sample_deals(deals, rng, data_path, python_cap):
+	from SampleDeals import sample_deals
+	start = time()
+	sample_deals(deals, 5, rng)
+	return time() - start, deals
+
+def bench_score_get_score_vector(deals, rng, data_path, python_cap):
+	from ScoreDoubleDummy import get_score_vector
+	max_tricks = synthetic_max_tricks(synthetic_tricks(min(deals, python_cap), 5, rng))
+	start = time()
+	for hand in max_tricks:
+		get_score_vector(hand)
+	return time() - start, len(max_tricks)
+
+def bench_score_score_tricks(deals, rng, data_path, python_cap):
+	from ScoreDoubleDummy import score_tricks
+	tricks = synthetic_tricks(deals, 5, rng)
+	start = time()
+	score_tricks(tricks)
+	return time() - start, deals
+
+def bench_clean_transform_line(deals, rng, data_path, python_cap):
+	from CleanDoubleDummy import transform_line
+	records = [synthetic_raw_record(rng) for _ in range(min(deals, python_cap))]
+	start = time()
+	for record in records:
+		transform_line(record)
+	return time() - start, len(records)
+
+def replay_rows(deals, rng):
+	X = (rng.random((deals, 88)) < 0.2).astype(np.float32)
+	return X, rng.random((deals, 36)).astype(np.float32)
+
+def filled_replay(deals, rng, prioritised):
+	from Actors.ReplayBuffer import ReplayBuffer
+	replay = ReplayBuffer(88, 36, capacity = deals, prioritised = prioritised, rng = rng)
+	replay.add(*replay_rows(deals, rng), priorities = rng.random(deals) if prioritised else None)
+	return replay
+
+def bench_replay_add(deals, rng, data_path, python_cap):
+	from Actors.ReplayBuffer import ReplayBuffer
+	replay = ReplayBuffer(88, 36, capacity = deals, rng = rng)
+	X, Y = replay_rows(deals, rng)
+	start = time()
+	replay.add(X, Y)
+	return time() - start, deals
+
+def bench_replay_sample_uniform(deals, rng, data_path, python_cap):
+	replay = filled_replay(deals, rng, False)
+	start = time()
+	replay.sample(deals)
+	return time() - start, deals
+
+def bench_replay_sample_prioritised(deals, rng, data_path, python_cap):
+	replay = filled_replay(deals, rng, True)
+	start = time()
+	replay.sample(deals)
+	return time() - start, deals
+
+class StubPredictor:
+	"""
+	Stands in for a predict mode Agent, returning random predictions.
+	"""
+	def __init__(self, rng):
+		self.rng = rng
+
+	def setup(self, *args, **kwargs):
+		pass
+
+	def set_checkpoints(self, *args):
+		pass
+
+	def load_best_checkpoint(self):
+		pass
+
+	def set_weights(self, weights):
+		pass
+
+	def predict_model(self, X):
+		return self.rng.random((len(X), 36))
+
+class StubTrainer(StubPredictor):
+	"""
+	Stands in for a train mode Agent, without training.
+	"""
+	best_weights = None
+	epochs_used = None
+
+	def load_warm_start(self, *args):
+		return False
+
+	def train_model(self, save_checkpoints = True):
+		pass
+
+	def get_weights(self):
+		return []
+
+def bench_system_episode(deals, rng, data_path, python_cap):
+	from System import System
+	system = System()
+	system.setup_arguments(["--base_dir", os.path.dirname(data_path), "--raw_data_path", os.path.basename(data_path),
+				"--episode_size", str(deals)])
+	system.setup_checkpoints()
+	system.setup_metrics()
+	system.setup_episode()
+	system.setup_actors()
+	system.predictor = StubPredictor(rng)
+	system.trainer = StubTrainer(rng)
+	start = time()
+	system.episode_step()
+	for _ in range(system.args.max_steps):
+		system.complete_step()
+	system.close()
+	return time() - start, deals
+
+benchmarks = {
+	"bandit.decision": bench_bandit_decision,
+	"datamanager.load": bench_datamanager_load,
+	"datamanager.decode": bench_datamanager_decode,
+	"datamanager.concatenate_data": bench_datamanager_concatenate_data,
+	"datamanager.IMP": bench_datamanager_imp,
+	"datamanager.pre_step": bench_datamanager_pre_step,
+	"datamanager.advance": bench_datamanager_advance,
+	"sample.deals": bench_sample_deals,
+	"score.get_score_vector": bench_score_get_score_vector,
+	"score.score_tricks": bench_score_score_tricks,
+	"clean.transform_line": bench_clean_transform_line,
+	"replay.add": bench_replay_add,
+	"replay.sample_uniform": bench_replay_sample_uniform,
+	"replay.sample_prioritised": bench_replay_sample_prioritised,
+	"system.episode": bench_system_episode,
+}
+
+def run_benchmark(name, deals, seed, data_path, python_cap, results):
+	"""
+	Runs one benchmark on a fresh process, so that its peak RSS is its own.
+	"""
+	try:
+		seconds, items = benchmarks[name](deals, np.random.default_rng(seed), data_path, python_cap)
+		results.put({"status": "ok", "seconds": seconds, "items": items,
+			"peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0})
+	except ImportError as error:
+		results.put({"status": "skipped", "reason": str(error)})
+	except Exception as error:
+		results.put({"status": "error", "reason": repr(error)})
+
+def wait_for_result(worker, results, poll_seconds = 1.0):
+	"""
+	Returns the result a benchmark process puts on results, or an error if the process dies without one
+	(e.g. killed for running out of memory).
+	"""
+	while worker.is_alive():
+		try:
+			return results.get(timeout = poll_seconds)
+		except queue.Empty:
+			pass
+	worker.join()
+	# The result of a worker that exited just after putting it may still be on its way.
+	try:
+		return results.get(timeout = poll_seconds)
+	except queue.Empty:
+		return {"status": "error", "reason": "worker exited with code {}".format(worker.exitcode)}
+
+def get_commit():
+	try:
+		return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd = root,
+						stderr = subprocess.DEVNULL).decode().strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+def get_arguments_from_command_line():
+	parser = ArgumentParser()
+	parser.add_argument("--deals", type = int, nargs = "+", default = [10000, 100000],
+			help = "Scales to benchmark at, e.g. 10000 100000 1000000 10000000")
+	parser.add_argument("--benchmarks", nargs = "+", default = sorted(benchmarks), choices = sorted(benchmarks))
+	parser.add_argument("--chunks", type = int, default = 2, help = "Chunks the synthetic corpus is split into")
+	parser.add_argument("--python_cap", type = int, default = 20000,
+			help = "Maximum deals timed for benchmarks that loop over deals in Python")
+	parser.add_argument("--output", default = os.path.join(root, "Benchmarks", "results.jsonl"),
+			help = "JSONL file the results are appended to")
+	parser.add_argument("--data_dir", default = None, help = "Directory for the synthetic corpus (Default: temporary)")
+	parser.add_argument("--seed", type = int, default = 0)
+	return parser.parse_args()
+
+def run_scale(args, deals, data_dir, commit, context, f):
+	"""
+	Writes the synthetic corpus of a scale and runs every benchmark on it, appending the results to f.
+	"""
+	data_path = write_chunks(os.path.join(data_dir, str(deals)), deals, args.chunks,
+				np.random.default_rng(args.seed))
+	for name in args.benchmarks:
+		results = context.Queue()
+		worker = context.Process(target = run_benchmark,
+					args = (name, deals, args.seed, data_path, args.python_cap, results))
+		worker.start()
+		result = wait_for_result(worker, results)
+		worker.join()
+
+		result.update({"benchmark": name, "deals": deals, "commit": commit,
+			"time": strftime("%Y-%m-%dT%H:%M:%S")})
+		if result["status"] == "ok":
+			result["throughput"] = result["items"] / max(result["seconds"], 1e-9)
+			print("{:<30} {:>9} deals {:>10.4f}s {:>14.0f} items/s {:>9.1f}M peak RSS".format(
+				name, deals, result["seconds"], result["throughput"], result["peak_rss_mb"]))
+		else:
+			print("{:<30} {:>9} deals skipped: {}".format(name, deals, result["reason"]))
+		f.write(json.dumps(result) + "\n")
+		f.flush()
+
+def main():
+	args = get_arguments_from_command_line()
+	commit = get_commit()
+	data_dir = args.data_dir or tempfile.mkdtemp()
+	context = multiprocessing.get_context("spawn")
+
+	# A temporary corpus is removed as soon as its scale has been benchmarked, since it takes gigabytes at 10M deals.
+	try:
+		with open(args.output, "a") as f:
+			for deals in args.deals:
+				run_scale(args, deals, data_dir, commit, context, f)
+				if args.data_dir is None:
+					shutil.rmtree(os.path.join(data_dir, str(deals)))
+	finally:
+		if args.data_dir is None:
+			shutil.rmtree(data_dir, ignore_errors = True)
+
+if __name__ == "__main__":
+	main()
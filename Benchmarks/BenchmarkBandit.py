@@ -0,0 +1,85 @@
+import os
+import sys
+from time import time
+from argparse import ArgumentParser
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "System"))
+from Actors.Bandit import EpsilonBandit
+
+def legacy_decision(options, prev_bid, epsilon):
+	"""
+	The per-deal loop EpsilonBandit.decision used before it was vectorised, kept as the baseline.
+	"""
+	choice = np.random.choice(np.arange(0, 2), size = prev_bid.shape,
+								p = [epsilon, 1 - epsilon] )
+
+	bid = np.zeros(prev_bid.shape)
+
+	for idx in range(len(choice)):
+		if choice[idx] == 0:
+			offset = int(prev_bid[idx] + 1)
+			bid[idx] = np.argmax(options[idx][offset:]) + offset
+			if(options[idx][0] >= options[idx][int(bid[idx])]):
+				bid[idx] = 0
+		else:
+			bid[idx] = np.random.randint(prev_bid[idx],36)
+
+	return bid
+
+def legacy_greedy(options, prev_bid):
+	"""
+	The greedy branch of legacy_decision, used to check that the vectorised rule picks the same bids.
+	"""
+	bid = np.zeros(prev_bid.shape, dtype = int)
+	for idx in range(len(prev_bid)):
+		offset = int(prev_bid[idx] + 1)
+		bid[idx] = np.argmax(options[idx][offset:]) + offset
+		if(options[idx][0] >= options[idx][bid[idx]]):
+			bid[idx] = 0
+	return bid
+
+def random_episode(deals, rng):
+	"""
+	Returns random predictions and previous bids for an episode of the given size.
+	"""
+	options = rng.random((deals, 36))
+	prev_bid = rng.integers(-1, 35, size = deals).astype(np.int16)
+	return options, prev_bid
+
+def timed(function, repeats):
+	"""
+	Returns the best wall time of repeats calls to function.
+	"""
+	best = float("inf")
+	for _ in range(repeats):
+		start = time()
+		function()
+		best = min(best, time() - start)
+	return best
+
+def get_arguments_from_command_line():
+	parser = ArgumentParser()
+	parser.add_argument("--deals", type = int, nargs = "+", default = [10000, 100000])
+	parser.add_argument("--epsilon", type = float, default = 0.1)
+	parser.add_argument("--repeats", type = int, default = 3)
+	parser.add_argument("--seed", type = int, default = 0)
+	return parser.parse_args()
+
+def main():
+	args = get_arguments_from_command_line()
+	rng = np.random.default_rng(args.seed)
+	bandit = EpsilonBandit(args.epsilon, rng = rng)
+
+	for deals in args.deals:
+		options, prev_bid = random_episode(deals, rng)
+		assert np.array_equal(bandit.greedy(options, prev_bid), legacy_greedy(options, prev_bid))
+
+		legacy = timed(lambda: legacy_decision(options, prev_bid, args.epsilon), args.repeats)
+		vectorised = timed(lambda: bandit.decision(options, prev_bid), args.repeats)
+		print("{:>9} deals  loop {:8.4f}s  vectorised {:8.4f}s  speedup {:7.1f}x".format(
+			deals, legacy, vectorised, legacy / vectorised))
+
+if __name__ == "__main__":
+	main()
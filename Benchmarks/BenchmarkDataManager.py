@@ -0,0 +1,111 @@
+import os
+import sys
+import shutil
+import tempfile
+import tracemalloc
+from time import time
+from argparse import ArgumentParser
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "System"))
+from Actors.Bandit import EpsilonBandit
+from Actors.DataManager import DataManager
+from Synthetic import write_chunks
+
+class LegacyEpisode:
+	"""
+	The copy-per-step episode state DataManager used before the active-set buffers, kept as the baseline.
+	"""
+	def __init__(self, N, S, IMP, monotonic_penalty = 0.0):
+		self.N = N
+		self.S = S
+		self.IMP = IMP
+		self.monotonic_penalty = monotonic_penalty
+		self.BidHistory = np.zeros(self.IMP.shape)
+		self.PrevBid = np.ones(self.N.shape[0], dtype = np.int16) * -1
+		self.X = None
+
+	def concatenate_data(self, step):
+		if step % 2 == 0:
+			self.X = np.concatenate([self.N, self.BidHistory], axis = 1)
+		else:
+			self.X = np.concatenate([self.S, self.BidHistory], axis = 1)
+
+	def post_step(self):
+		self.BidHistory[range(len(self.PrevBid)), np.asarray(self.PrevBid, dtype = int)] = 1
+		uncompleted_idx_mask = np.logical_and(self.PrevBid != 35, self.PrevBid != 0)
+		self.N = self.N[uncompleted_idx_mask]
+		self.S = self.S[uncompleted_idx_mask]
+		self.IMP = self.IMP[uncompleted_idx_mask]
+		self.BidHistory = self.BidHistory[uncompleted_idx_mask]
+		self.X = self.X[uncompleted_idx_mask]
+		self.PrevBid = self.PrevBid[uncompleted_idx_mask]
+		for idx in range(len(self.PrevBid)):
+			self.IMP[idx,:int(self.PrevBid[idx])] = self.monotonic_penalty
+
+def measure(function):
+	"""
+	Returns the wall time and the peak memory traced while calling function.
+	"""
+	tracemalloc.start()
+	start = time()
+	function()
+	elapsed = time() - start
+	_, peak = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+	return elapsed, peak
+
+def get_arguments_from_command_line():
+	parser = ArgumentParser()
+	parser.add_argument("--deals", type = int, default = 200000)
+	parser.add_argument("--steps", type = int, default = 8)
+	parser.add_argument("--seed", type = int, default = 0)
+	return parser.parse_args()
+
+def compare_episode(data_path, args, rng):
+	"""
+	Plays the first chunk of data_path as an episode with both versions, checking that they agree at every step.
+	"""
+	manager = DataManager(data_path)
+	manager.load(0)
+	legacy = LegacyEpisode(*manager.decode(np.load(data_path.format(0))))
+	bandit = EpsilonBandit(0.1, rng = rng)
+
+	# Timings cover building the model input and targets (pre_step) as well as post_step, since the
+	# active-set version applies the monotonic penalty when the targets are gathered.
+	print("{:>4} {:>9} {:>12} {:>12} {:>14} {:>14}".format(
+		"step", "active", "legacy (s)", "advance (s)", "legacy peak", "advance peak"))
+	for step in range(args.steps):
+		legacy_pre_time, legacy_pre_peak = measure(lambda: legacy.concatenate_data(step))
+		advance_pre_time, advance_pre_peak = measure(lambda: manager.pre_step(step))
+		assert np.array_equal(manager.X, legacy.X) and np.array_equal(manager.train_data[1], legacy.IMP)
+
+		bids = bandit.decision(rng.random((len(manager.active), 36)), manager.PrevBid)
+		legacy.PrevBid = bids
+		manager.PrevBid = bids
+		active = len(bids)
+
+		# The targets the bids are scored against (see System.test) are those of the step, unchanged by the bids.
+		assert np.array_equal(manager.train_data[1], legacy.IMP)
+
+		legacy_time, legacy_peak = measure(legacy.post_step)
+		advance_time, advance_peak = measure(manager.post_step)
+		assert np.array_equal(manager.IMP, legacy.IMP) and np.array_equal(manager.PrevBid, legacy.PrevBid)
+		print("{:>4} {:>9} {:>12.4f} {:>12.4f} {:>13.1f}M {:>13.1f}M".format(
+			step, active, legacy_pre_time + legacy_time, advance_pre_time + advance_time,
+			max(legacy_pre_peak, legacy_peak) / 2.0**20, max(advance_pre_peak, advance_peak) / 2.0**20))
+		if len(manager.active) == 0:
+			break
+
+def main():
+	args = get_arguments_from_command_line()
+	rng = np.random.default_rng(args.seed)
+	directory = tempfile.mkdtemp()
+	try:
+		compare_episode(write_chunks(directory, args.deals, 1, rng), args, rng)
+	finally:
+		shutil.rmtree(directory)
+
+if __name__ == "__main__":
+	main()
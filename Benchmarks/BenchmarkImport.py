@@ -0,0 +1,83 @@
+import os
+import sys
+import json
+import subprocess
+from time import time
+from argparse import ArgumentParser
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Statements timed on a fresh interpreter each, run from the System directory.
+statements = {
+	"Actors": "import Actors",
+	"Actors.DataManager": "from Actors import DataManager, EpsilonBandit",
+	"System": "from System import System",
+	"Evaluate": "import Evaluate",
+}
+
+# Modules that must not be loaded by any of the statements.
+frameworks = ["tensorflow", "keras", "torch"]
+
+probe = """
+import sys, json
+from time import time
+start = time()
+{}
+seconds = time() - start
+print(json.dumps({{"seconds": seconds, "loaded": [name for name in {} if name in sys.modules]}}))
+"""
+
+def time_statement(statement):
+	"""
+	Returns the import time of statement on a fresh interpreter and the frameworks it loaded.
+	"""
+	output = subprocess.check_output([sys.executable, "-c", probe.format(statement, frameworks)],
+					cwd = os.path.join(root, "System"))
+	result = json.loads(output.decode().strip().splitlines()[-1])
+	return result["seconds"], result["loaded"]
+
+def time_help(script):
+	"""
+	Returns the wall time of python System/<script> --help, interpreter start up included.
+	Raises if the script fails to start, e.g. on conflicting arguments.
+	"""
+	start = time()
+	subprocess.check_call([sys.executable, os.path.join(root, "System", script), "--help"],
+				stdout = subprocess.DEVNULL)
+	return time() - start
+
+def get_arguments_from_command_line():
+	parser = ArgumentParser()
+	parser.add_argument("--max_seconds", type = float, default = 0.5,
+			help = "Fail if any statement takes longer to import")
+	parser.add_argument("--max_help_seconds", type = float, default = 1.0,
+			help = "Fail if main.py or Evaluate.py --help takes longer")
+	parser.add_argument("--repeats", type = int, default = 3)
+	return parser.parse_args()
+
+def main():
+	args = get_arguments_from_command_line()
+	failures = []
+
+	for name, statement in statements.items():
+		timings = [time_statement(statement) for _ in range(args.repeats)]
+		seconds = min(timing[0] for timing in timings)
+		loaded = sorted(set(sum([timing[1] for timing in timings], [])))
+		print("{:<20} {:8.4f}s{}".format(name, seconds, "  loaded " + ", ".join(loaded) if loaded else ""))
+		if loaded:
+			failures.append("{} loads {}".format(name, ", ".join(loaded)))
+		if seconds > args.max_seconds:
+			failures.append("{} takes {:.3f}s > {}s".format(name, seconds, args.max_seconds))
+
+	for script in ["main.py", "Evaluate.py"]:
+		seconds = min(time_help(script) for _ in range(args.repeats))
+		print("{:<20} {:8.4f}s".format(script + " --help", seconds))
+		if seconds > args.max_help_seconds:
+			failures.append("{} --help takes {:.3f}s > {}s".format(script, seconds, args.max_help_seconds))
+
+	for failure in failures:
+		print("FAILED: {}".format(failure))
+	sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,133 @@
+import os
+import sys
+import tempfile
+from time import time
+from argparse import ArgumentParser
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "System"))
+from Actors import Agent
+from Actors.NumpyAgent import fold_weights, save_folded, exported_path
+
+def random_weights(layers, units, rng, input_size = 88, output_size = 36):
+	"""
+	Returns a get_weights() list of an Agent model with random weights and BatchNorm statistics.
+	"""
+	weights = []
+	size = input_size
+	for _ in range(layers - 1):
+		weights += [rng.normal(scale = 0.2, size = (size, units)), rng.normal(size = units),
+			rng.normal(1, 0.1, size = units), rng.normal(size = units),
+			rng.normal(size = units), rng.random(units) + 0.5]
+		size = units
+	weights += [rng.normal(scale = 0.2, size = (size, output_size)), rng.normal(size = output_size)]
+	return [weight.astype(np.float32) for weight in weights]
+
+def random_input(deals, rng):
+	"""
+	Returns model inputs shaped like DataManager.X: a one hot hand and a bidding history.
+	"""
+	X = np.zeros((deals, 88), dtype = np.float32)
+	X[np.arange(deals).reshape(-1, 1), np.argsort(rng.random((deals, 52)), axis = 1)[:, :13]] = 1
+	X[:, 52:] = rng.random((deals, 36)) < 0.05
+	return X
+
+def reference_predict(weights, X, epsilon = 1e-3):
+	"""
+	Runs an Agent model layer by layer in float64, as Keras does in inference:
+	(Dense, ReLU, Dropout as the identity, BatchNorm) for every hidden block, then Dense and ReLU.
+	"""
+	hidden = np.asarray(X, dtype = np.float64)
+	for idx in range(0, len(weights) - 2, 6):
+		kernel, bias, gamma, beta, mean, variance = [np.asarray(weight, dtype = np.float64) for weight in weights[idx : idx + 6]]
+		hidden = np.maximum(hidden.dot(kernel) + bias, 0)
+		hidden = gamma * (hidden - mean) / np.sqrt(variance + epsilon) + beta
+	return np.maximum(hidden.dot(weights[-2]) + weights[-1], 0)
+
+def check_exported(weights, layers, units, X):
+	"""
+	Checks that a numpy Agent loading the weight file exported next to a checkpoint predicts as one given the
+	weights in memory, without needing Keras: the checkpoint is a placeholder older than its export.
+	"""
+	with tempfile.TemporaryDirectory() as directory:
+		checkpoint = os.path.join(directory, "01-0.1000.hdf5")
+		with open(checkpoint, "wb") as f:
+			f.write(b"placeholder")
+		save_folded(fold_weights(weights), exported_path(checkpoint))
+		os.utime(checkpoint, (0, 0))
+		agent = Agent(88, layers, units, 36, "predict", backend = "numpy")
+		agent.setup(None, directory, load_checkpoint = False)
+		agent.backend.load_weights(checkpoint)
+		return agent.predict_model(X)
+
+def timed(function, repeats):
+	best = float("inf")
+	for _ in range(repeats):
+		start = time()
+		function()
+		best = min(best, time() - start)
+	return best
+
+def keras_agent(layers, units, weights, checkpoint_dir):
+	"""
+	Returns a predict mode Keras Agent with the given weights, or None if Keras is not installed.
+	"""
+	agent = Agent(88, layers, units, 36, "predict")
+	try:
+		agent.setup(None, checkpoint_dir, load_checkpoint = False)
+	except ImportError as error:
+		print("Skipping the Keras comparison: {}".format(error))
+		return None
+	agent.set_weights(weights)
+	return agent
+
+def get_arguments_from_command_line():
+	parser = ArgumentParser()
+	parser.add_argument("--layers", type = int, default = 2)
+	parser.add_argument("--units", type = int, default = 30)
+	parser.add_argument("--deals", type = int, nargs = "+", default = [1, 64, 10000, 1000000])
+	parser.add_argument("--repeats", type = int, default = 3)
+	parser.add_argument("--seed", type = int, default = 0)
+	return parser.parse_args()
+
+def compare(args, checkpoint_dir):
+	"""
+	Checks the numpy backend against the unfolded model (and Keras, if installed) and times both.
+	"""
+	rng = np.random.default_rng(args.seed)
+	weights = random_weights(args.layers, args.units, rng)
+	numpy_agent = Agent(88, args.layers, args.units, 36, "predict", backend = "numpy")
+	numpy_agent.setup(None, checkpoint_dir, load_checkpoint = False)
+	numpy_agent.set_weights(weights)
+	agent = keras_agent(args.layers, args.units, weights, checkpoint_dir)
+
+	# The folded network is checked against the unfolded one whether or not Keras is installed.
+	X = random_input(1000, rng)
+	expected = reference_predict(weights, X)
+	predictions = numpy_agent.predict_model(X)
+	assert np.allclose(predictions, expected, rtol = 1e-4, atol = 1e-4 * np.abs(expected).max()), \
+		"NumPy predictions differ from the unfolded model"
+	assert np.array_equal(check_exported(weights, args.layers, args.units, X), predictions), \
+		"Predictions from the exported weight file differ"
+
+	for deals in args.deals:
+		X = random_input(deals, rng)
+		numpy_time = timed(lambda: numpy_agent.predict_model(X), args.repeats)
+		line = "{:>9} deals  numpy {:9.5f}s ({:12.0f} deals/s)".format(deals, numpy_time, deals / numpy_time)
+		if agent is not None:
+			expected = agent.predict_model(X)
+			assert np.allclose(numpy_agent.predict_model(X), expected, rtol = 1e-3, atol = 1e-3 * np.abs(expected).max()), \
+				"NumPy predictions differ from Keras"
+			keras_time = timed(lambda: agent.predict_model(X), args.repeats)
+			line += "  keras {:9.5f}s ({:12.0f} deals/s)  speedup {:6.1f}x".format(
+				keras_time, deals / keras_time, keras_time / numpy_time)
+		print(line)
+
+def main():
+	args = get_arguments_from_command_line()
+	with tempfile.TemporaryDirectory() as checkpoint_dir:
+		compare(args, checkpoint_dir)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,132 @@
+import os
+import sys
+import shutil
+import tempfile
+from time import time
+from argparse import ArgumentParser
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "System"))
+from Actors.Bandit import EpsilonBandit
+from Actors.DataManager import DataManager
+from Actors.ReplayBuffer import ReplayBuffer
+from Actors.Snapshots import SnapshotManager
+from Synthetic import write_chunks
+
+class Run:
+	"""
+	The state of a training run that System snapshots (see System.save_snapshot and System.resume): the deals and
+	bidding sequences of the episode, the bandit and a memmap backed replay buffer, each on its own stream of seed.
+	"""
+	def __init__(self, data_path, replay_path, args, seed):
+		self.args = args
+		self.data_manager = DataManager(data_path, episode_size = args.deals, shuffle = True, seed = seed)
+		self.bandit = EpsilonBandit(args.epsilon, rng = np.random.default_rng([seed, 3]))
+		self.replay = ReplayBuffer(88, 36, capacity = args.replay_capacity, path = replay_path, prioritised = True,
+					rng = np.random.default_rng([seed, 4]))
+
+	def step(self, step):
+		"""
+		Plays a step as System.complete_step does and returns everything the step produced.
+		"""
+		manager = self.data_manager
+		outputs = {"active": manager.active.copy()}
+		manager.pre_step(step)
+		# Options seeded by the step stand in for the predictions of identically trained models.
+		options = np.random.default_rng([self.args.seed, step]).random((len(manager.active), 36))
+		manager.PrevBid = outputs["bids"] = self.bandit.decision(options, manager.PrevBid)
+		manager.post_step()
+		X, Y = manager.train_data
+		outputs.update(X = X.copy(), IMP = Y.copy(), history = manager.history.copy(), next_active = manager.active.copy())
+		if len(self.replay) > 0:
+			replay_X, replay_Y, indices = self.replay.sample(len(X))
+			outputs.update(replay_X = replay_X, replay_Y = replay_Y, replay_indices = indices)
+		self.replay.add(X, Y)
+		if "replay_indices" in outputs:
+			self.replay.update_priorities(outputs["replay_indices"], np.abs(outputs["replay_Y"] - 0.5).mean(axis = 1) + 1e-3)
+		return outputs
+
+	def save(self, snapshots, step):
+		"""
+		Snapshots the run before the given step, returning the bytes written.
+		"""
+		self.replay.flush()
+		state = {"step": step, "episode": 0, "bandit_rng": self.bandit.rng.bit_generator.state,
+			"replay": self.replay.state()}
+		return snapshots.save(state, {"data_{}".format(key): array for key, array in self.data_manager.snapshot().items()})
+
+	def restore(self, snapshots):
+		state = snapshots.state()
+		self.bandit.rng.bit_generator.state = state["bandit_rng"]
+		self.replay.restore_state(state["replay"])
+		self.data_manager.restore({key[len("data_"):]: array for key, array in snapshots.arrays().items()})
+		return state["step"]
+
+def assert_same(expected, outputs, step):
+	assert sorted(expected) == sorted(outputs), "step {}: {} != {}".format(step, sorted(expected), sorted(outputs))
+	for key in expected:
+		assert np.array_equal(expected[key], outputs[key]), "step {}: {} differs after resuming".format(step, key)
+
+def get_arguments_from_command_line():
+	parser = ArgumentParser()
+	parser.add_argument("--deals", type = int, default = 20000)
+	parser.add_argument("--steps", type = int, default = 8)
+	parser.add_argument("--epsilon", type = float, default = 0.1)
+	parser.add_argument("--replay_capacity", type = int, default = 50000)
+	parser.add_argument("--seed", type = int, default = 0)
+	return parser.parse_args()
+
+def check_resume(directory, args):
+	"""
+	Checks that every snapshot of an episode resumes it exactly, in a corpus written to directory.
+	"""
+	data_path = write_chunks(directory, args.deals * 2, 2, np.random.default_rng(args.seed))
+
+	# The uninterrupted run every resumed run has to reproduce, step by step.
+	reference = Run(data_path, os.path.join(directory, "Replay"), args, args.seed)
+	reference.data_manager.load(0)
+	expected = []
+	for step in range(args.steps):
+		expected.append(reference.step(step))
+		if len(reference.data_manager.active) == 0:
+			break
+
+	print("{:>4} {:>9} {:>13} {:>14} {:>13}".format("step", "active", "snapshot (s)", "snapshot size", "restore (s)"))
+	for resume_step in range(1, len(expected)):
+		run_dir = os.path.join(directory, "Resume-{}".format(resume_step))
+		interrupted = Run(data_path, os.path.join(run_dir, "Replay"), args, args.seed)
+		interrupted.data_manager.load(0)
+		for step in range(resume_step):
+			interrupted.step(step)
+		snapshots = SnapshotManager(os.path.join(run_dir, "Snapshots"))
+		start = time()
+		written = interrupted.save(snapshots, resume_step)
+		save_time = time() - start
+
+		# Resumed in a new process: every stream starts elsewhere, so parity can only come from the snapshot.
+		resumed = Run(data_path, os.path.join(run_dir, "Replay"), args, args.seed + 1)
+		start = time()
+		assert resumed.restore(snapshots) == resume_step
+		restore_time = time() - start
+		for name in ["active", "bids", "history"]:
+			assert np.array_equal(getattr(resumed.data_manager, name), getattr(interrupted.data_manager, name)), name
+		assert resumed.bandit.rng.bit_generator.state == interrupted.bandit.rng.bit_generator.state
+		assert resumed.replay.state() == interrupted.replay.state()
+
+		for step in range(resume_step, len(expected)):
+			assert_same(expected[step], resumed.step(step), step)
+		print("{:>4} {:>9} {:>13.4f} {:>13.1f}K {:>13.4f}".format(resume_step, len(expected[resume_step]["active"]),
+			save_time, written / 2.0**10, restore_time))
+		shutil.rmtree(run_dir)
+
+def main():
+	args = get_arguments_from_command_line()
+	directory = tempfile.mkdtemp()
+	try:
+		check_resume(directory, args)
+	finally:
+		shutil.rmtree(directory)
+
+if __name__ == "__main__":
+	main()
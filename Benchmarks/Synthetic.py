@@ -0,0 +1,74 @@
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "GeneratingData"))
+from SampleDeals import sample_deals, hand_cards, hand_vectors
+
+# Synthetic stand-ins for the DDS generated data, so that the hot paths can be benchmarked at any scale
+# without running the solver. Deals come from GeneratingData/SampleDeals.py, with cards indexed
+# as 13 * suite + rank - 2, as in ScoreDoubleDummy.get_hand_vector.
+
+def synthetic_hands(deals, rng):
+	"""
+	Returns one hot (deals, 52) N and S hands.
+	"""
+	owners = sample_deals(deals, 1, rng)[:, 0]
+	return hand_vectors(owners, 0), hand_vectors(owners, 2)
+
+def synthetic_imps(deals, rng):
+	"""
+	Returns integer (deals, 36) IMP vectors in [-24, 24].
+	"""
+	return rng.integers(-24, 25, size = (deals, 36))
+
+def synthetic_tricks(deals, samples, rng):
+	"""
+	Returns a (deals, samples, 5) array of double dummy tricks, as read from the MaxTricks of a cleaned file.
+	"""
+	return rng.integers(0, 14, size = (deals, samples, 5))
+
+def synthetic_max_tricks(tricks):
+	"""
+	Converts a tricks array into the MaxTricks lists written by CleanDoubleDummy.py.
+	"""
+	return [[[[trump, int(count)] for trump, count in enumerate(sample)] for sample in deal] for deal in tricks]
+
+def synthetic_raw_record(rng, samples = 5):
+	"""
+	Returns the lines of one record of DoubleDummy output: samples games of 4 hands and 5 trick counts
+	sharing the N and S hands, followed by an empty line.
+	"""
+	owners = sample_deals(1, samples, rng)[0]
+	lines = []
+	for game in owners:
+		for hand in (hand_cards(game, 0), hand_cards(game, 2), hand_cards(game, 1), hand_cards(game, 3)):
+			lines.append("".join("{} {}\t".format(card // 13, 2 ** (card % 13 + 2)) for card in hand) + "\n")
+		for trump in range(5):
+			lines.append("{} {}\n".format(trump, rng.integers(0, 14)))
+	lines.append("\n")
+	return lines
+
+def synthetic_rows(deals, rng):
+	"""
+	Returns (deals, 140) rows in the vectorised format written by VectoriseDoubleDummy.py.
+	"""
+	north, south = synthetic_hands(deals, rng)
+	return np.concatenate([north, south, (synthetic_imps(deals, rng) + 24.0) / 48.0], axis = 1)
+
+def write_chunks(directory, deals, chunks, rng, batch_size = 1000000):
+	"""
+	Writes deals synthetic rows split into chunks Data-{i}.npy files and returns their path format.
+	Rows are written batch_size at a time, so the corpus never has to fit in memory.
+	"""
+	if not os.path.exists(directory):
+		os.makedirs(directory)
+	sizes = [deals // chunks + (chunk < deals % chunks) for chunk in range(chunks)]
+	for chunk, size in enumerate(sizes):
+		data = np.lib.format.open_memmap(os.path.join(directory, "Data-{}.npy".format(chunk)),
+						mode = "w+", dtype = np.float64, shape = (size, 140))
+		for offset in range(0, size, batch_size):
+			data[offset : offset + batch_size] = synthetic_rows(min(batch_size, size - offset), rng)
+		data.flush()
+		del data
+	return os.path.join(directory, "Data-{}.npy")
@@ -36,6 +36,25 @@ def transform_line(line):
 	line = jsonify_data_point(line)
 	return line
 
+def read_records(f):
+	"""
+	Lazily yields the raw records of a DoubleDummy output file, one list of lines at a time.
+	A record holds 9 lines for each of its E/W samples and ends with an empty line, so records may differ in length.
+	"""
+	record = []
+	for line in f:
+		record.append(line)
+		if not line.strip():
+			yield record
+			record = []
+
+def count_records(path):
+	"""
+	Counts the records in a DoubleDummy output file without holding it in memory.
+	"""
+	with open(path, "r") as f:
+		return sum(1 for line in f if not line.strip())
+
 def get_paths_from_command_line():
 	parser = ArgumentParser()
 	parser.add_argument("src")
@@ -45,14 +64,13 @@ def get_paths_from_command_line():
 
 def main():
 	input_file, output_file = get_paths_from_command_line()
-	line = {}
 	with open(input_file,"r") as f:
-		lines = iterutils.chunked(f.readlines(), 46)
 		pool = Pool()
-		lines = list(pool.map(transform_line, lines))
+		lines = list(pool.imap(transform_line, read_records(f), chunksize = 256))
 		pool.close()
 	with open(output_file,"w") as f:
 		lines = {idx:line for idx, line in enumerate(lines)}
 		dump(lines, f, indent=4)
 
-main()
+if __name__ == "__main__":
+	main()
@@ -218,8 +218,37 @@ void compute_hand(int seed)
 	}
 }
 
+// Solve the deals read from stdin, one record of 52 bytes per deal: the hand holding each card,
+// indexed by 13 * suite + rank - 2, with hands in DDS order (0 North, 1 East, 2 South, 3 West).
+// Prints the 5 "trump tricks" lines of every deal, as compute_hand does.
+void solve_stdin()
+{
+	SetMaxThreads(0);
+
+	unsigned int R[cards_per_suite] = {R2, R3, R4, R5, R6, R7, R8, R9, RT, RJ, RQ, RK, RA};
+	unsigned char owners[cards_per_suite * suites];
+	while(fread(owners, 1, cards_per_suite * suites, stdin) == cards_per_suite * suites)
+	{
+		int holding[suites][players];
+		initialise_holding(holding);
+		for(int i=0; i<suites; i++)
+			for(int j=0; j<cards_per_suite; j++)
+				holding[i][owners[i*cards_per_suite + j]] |= R[j];
+
+		for(int trump_suit=0; trump_suit<5; trump_suit++)
+			solver(holding, trump_suit);
+	}
+	fflush(stdout);
+}
+
 int main(int argc, char **argv)
 {
+	if(argc > 1 && strcmp(argv[1], "--stdin") == 0)
+	{
+		solve_stdin();
+		return 0;
+	}
+
 	int offset, count;
 	sscanf(argv[1], "%d", &offset);
 	sscanf(argv[2], "%d", &count);
@@ -0,0 +1,297 @@
+import os
+import json
+import subprocess
+from argparse import ArgumentParser
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+# Hands in DDS order, as held by the owners of a deal: 0 North, 1 East, 2 South, 3 West.
+# DoubleDummy prints the hands of a game in the order N, S, E, W.
+hands = ["N", "E", "S", "W"]
+printed_hands = [0, 2, 1, 3]
+
+# Strains in DDS order (0 S, 1 H, 2 D, 3 C, 4 NT), as printed by DoubleDummy.
+strains = 5
+
+# A record of the cache: the 64 bit key of the deal, the deal itself (2 bits per card), the tricks of the side
+# of every hand with that hand on lead, per strain (-1 if not solved yet) and the clock of its last access.
+record_dtype = np.dtype([("key", np.uint64), ("deal", np.uint8, (13,)), ("tricks", np.int8, (strains, 4)),
+			("stamp", np.uint64)])
+
+def pack_deals(owners):
+	"""
+	Packs (deals, 52) owners, the hand holding each card indexed by 13 * suite + rank - 2,
+	into the canonical (deals, 13) byte encoding of the deals.
+	"""
+	owners = np.asarray(owners, dtype = np.uint8).reshape(-1, 13, 4)
+	return (owners[:, :, 0] << 6) | (owners[:, :, 1] << 4) | (owners[:, :, 2] << 2) | owners[:, :, 3]
+
+def unpack_deals(packed):
+	"""
+	Inverse of pack_deals.
+	"""
+	packed = np.asarray(packed, dtype = np.uint8)
+	return np.stack([(packed >> 6) & 3, (packed >> 4) & 3, (packed >> 2) & 3, packed & 3], axis = 2).reshape(-1, 52)
+
+def deal_keys(packed):
+	"""
+	Hashes packed deals to 64 bit keys (FNV-1a over the 13 bytes).
+	"""
+	keys = np.full(len(packed), 0xcbf29ce484222325, dtype = np.uint64)
+	prime = np.uint64(0x100000001b3)
+	with np.errstate(over = "ignore"):
+		for idx in range(packed.shape[1]):
+			keys ^= packed[:, idx].astype(np.uint64)
+			keys *= prime
+	return keys
+
+class DoubleDummyCache:
+
+	def __init__(self, path, max_entries = None):
+		"""
+		A persistent cache of double dummy results keyed by the canonical hash of the full deal.
+		Records live in a memmapped structured array (cache.npy, 49 bytes per deal); once max_entries deals
+		are cached, the least recently used ones are evicted. A sorted index of the keys is built on demand.
+		Parameters:
+			Necessary:
+				path: Directory of the cache
+			Optional:
+				max_entries: Size cap of the cache in deals (Default: that of an existing cache, or 10 million)
+		"""
+		self.path = path
+		self.records_path = os.path.join(path, "cache.npy")
+		self.meta_path = os.path.join(path, "meta.json")
+		self.meta = {"size": 0, "clock": 0, "hits": 0, "misses": 0, "evictions": 0}
+		self.order = None
+		self.sorted_keys = None
+
+		if not os.path.exists(path):
+			os.makedirs(path)
+		if os.path.exists(self.meta_path):
+			with open(self.meta_path) as f:
+				self.meta.update(json.load(f))
+			self.records = open_memmap(self.records_path, mode = "r+")
+			if max_entries is not None and len(self.records) != max_entries:
+				self.resize(max_entries)
+		else:
+			self.records = open_memmap(self.records_path, mode = "w+", dtype = record_dtype,
+						shape = (max_entries or 10000000,))
+
+	def resize(self, max_entries):
+		"""
+		Moves the cache to a new size cap, keeping the most recently used deals.
+		"""
+		keep = np.argsort(self.records["stamp"][:self.size])[::-1][:max_entries]
+		kept = np.array(self.records[np.sort(keep)])
+		del self.records
+		self.records = open_memmap(self.records_path + ".partial", mode = "w+", dtype = record_dtype,
+					shape = (max_entries,))
+		self.records[:len(kept)] = kept
+		self.records.flush()
+		os.replace(self.records_path + ".partial", self.records_path)
+		self.meta["evictions"] += self.size - len(kept)
+		self.meta["size"] = len(kept)
+		self.order = None
+		self.flush()
+
+	@property
+	def size(self):
+		return self.meta["size"]
+
+	@property
+	def capacity(self):
+		return len(self.records)
+
+	def __len__(self):
+		return self.size
+
+	def index(self):
+		if self.order is None:
+			self.order = np.argsort(self.records["key"][:self.size], kind = "stable")
+			self.sorted_keys = self.records["key"][:self.size][self.order]
+		return self.order, self.sorted_keys
+
+	def find(self, keys):
+		"""
+		Returns the slots of the keys in the cache, -1 for the keys not cached.
+		"""
+		keys = np.asarray(keys, dtype = np.uint64)
+		order, sorted_keys = self.index()
+		if len(sorted_keys) == 0:
+			return np.full(len(keys), -1, dtype = np.int64)
+		positions = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+		return np.where(sorted_keys[positions] == keys, order[positions], -1)
+
+	def touch(self, slots):
+		self.meta["clock"] += 1
+		self.records["stamp"][slots] = self.meta["clock"]
+
+	def lookup(self, packed, leader = 0):
+		"""
+		Looks up packed deals. A deal is a hit if all its strains are known with leader on lead.
+		Returns the hit mask and the (deals, strains, 4) tricks, -1 where unknown.
+		"""
+		packed = np.asarray(packed, dtype = np.uint8)
+		slots = self.find(deal_keys(packed))
+		found = slots >= 0
+		# A different deal with the same key is a miss.
+		found[found] = np.all(self.records["deal"][slots[found]] == packed[found], axis = 1)
+		tricks = np.full((len(packed), strains, 4), -1, dtype = np.int8)
+		tricks[found] = self.records["tricks"][slots[found]]
+		hits = found & np.all(tricks[:, :, leader] >= 0, axis = 1)
+		self.touch(slots[found])
+		self.meta["hits"] += int(hits.sum())
+		self.meta["misses"] += int(len(packed) - hits.sum())
+		return hits, tricks
+
+	def records_of(self, keys):
+		"""
+		Returns the packed deals and tricks of cached keys, e.g. those of a shard. Raises KeyError for missing keys.
+		"""
+		slots = self.find(keys)
+		if np.any(slots < 0):
+			raise KeyError("{} of {} deals are not cached".format(int(np.sum(slots < 0)), len(slots)))
+		self.touch(slots)
+		return self.records["deal"][slots], self.records["tricks"][slots]
+
+	def insert(self, packed, tricks):
+		"""
+		Inserts deals with their (deals, strains, 4) tricks, -1 where unknown, merging them with the known
+		tricks of deals already cached. Evicts the least recently used deals if the cache is full.
+		"""
+		packed = np.asarray(packed, dtype = np.uint8)
+		tricks = np.asarray(tricks, dtype = np.int8)
+		keys = deal_keys(packed)
+		# Keep the last occurrence of every key within the batch.
+		_, last = np.unique(keys[::-1], return_index = True)
+		last = len(keys) - 1 - last
+		packed, tricks, keys = packed[last], tricks[last], keys[last]
+
+		slots = self.find(keys)
+		cached = slots >= 0
+		same = np.zeros(len(keys), dtype = np.bool_)
+		same[cached] = np.all(self.records["deal"][slots[cached]] == packed[cached], axis = 1)
+		merged = tricks.copy()
+		merged[same] = np.where(tricks[same] >= 0, tricks[same], self.records["tricks"][slots[same]])
+
+		new = np.flatnonzero(~cached)
+		filled = min(self.capacity - self.size, len(new))
+		new_slots = np.arange(self.size, self.size + filled)
+		if len(new) > filled:
+			stamps = np.array(self.records["stamp"][:self.size])
+			# Never evict the deals being updated in this batch.
+			stamps[slots[cached]] = np.iinfo(np.uint64).max
+			evict = min(len(new) - filled, self.size - int(cached.sum()))
+			victims = np.argpartition(stamps, evict - 1)[:evict] if evict > 0 else np.zeros(0, dtype = np.int64)
+			new_slots = np.concatenate([new_slots, victims])
+			self.meta["evictions"] += len(victims)
+		# Deals that do not fit (a batch larger than the cache) are not cached.
+		slots[new[:len(new_slots)]] = new_slots
+		self.meta["size"] += filled
+		write = slots >= 0
+
+		self.meta["clock"] += 1
+		self.records["key"][slots[write]] = keys[write]
+		self.records["deal"][slots[write]] = packed[write]
+		self.records["tricks"][slots[write]] = merged[write]
+		self.records["stamp"][slots[write]] = self.meta["clock"]
+		self.order = None
+
+	def stats(self):
+		lookups = self.meta["hits"] + self.meta["misses"]
+		return {"entries": self.size, "capacity": self.capacity, "hits": self.meta["hits"],
+			"misses": self.meta["misses"], "hit_rate": self.meta["hits"] / lookups if lookups else None,
+			"evictions": self.meta["evictions"]}
+
+	def flush(self):
+		"""
+		Flushes the records and atomically writes the metadata.
+		"""
+		self.records.flush()
+		with open(self.meta_path + ".partial", "w") as f:
+			json.dump(self.meta, f)
+		os.replace(self.meta_path + ".partial", self.meta_path)
+
+def solve(executable, owners, threads = 1):
+	"""
+	Solves deals with DoubleDummy --stdin, returning the (deals, strains) tricks of North's side with North on lead.
+	"""
+	owners = np.ascontiguousarray(owners, dtype = np.uint8)
+	if len(owners) == 0:
+		return np.zeros((0, strains), dtype = np.int8)
+	environment = dict(os.environ, OMP_NUM_THREADS = str(threads))
+	output = subprocess.run([executable, "--stdin"], input = owners.tobytes(), stdout = subprocess.PIPE,
+				env = environment, check = True).stdout.decode().split("\n")
+	tricks = np.array([line.split() for line in output if line], dtype = np.int64)
+	assert tricks.shape == (len(owners) * strains, 2), "Unexpected DoubleDummy output"
+	return tricks[:, 1].reshape(-1, strains).astype(np.int8)
+
+def solve_with_cache(cache, executable, owners, threads = 1):
+	"""
+	Solves deals, only running the solver on the deals the cache does not hold, and caches the new results.
+	Returns the (deals, strains) tricks with North on lead.
+	"""
+	packed = pack_deals(owners)
+	hits, tricks = cache.lookup(packed)
+	misses = np.flatnonzero(~hits)
+	tricks[misses, :, 0] = solve(executable, np.asarray(owners)[misses], threads)
+	cache.insert(packed[misses], tricks[misses])
+	return tricks[:, :, 0]
+
+def format_records(owners, tricks, counts = None):
+	"""
+	Formats games as the records of a DoubleDummy output file.
+	Parameters:
+		owners: (deals, samples, 52) owners of the cards; the samples of a deal share the N and S hands
+		tricks: (deals, samples, strains) tricks with North on lead
+		counts: Number of samples of every deal, when deals have fewer than samples (Default: all samples)
+	"""
+	lines = []
+	if counts is None:
+		counts = np.full(len(owners), owners.shape[1])
+	for deal_owners, deal_tricks, count in zip(owners, tricks, counts):
+		for game, game_tricks in zip(deal_owners[:count], deal_tricks[:count]):
+			for hand in printed_hands:
+				cards = np.flatnonzero(game == hand)
+				lines.append("".join("{} {}\t".format(card // 13, 2 ** (card % 13 + 2)) for card in cards) + "\n")
+			lines.extend("{} {}\n".format(trump, count) for trump, count in enumerate(game_tricks))
+		lines.append("\n")
+	return lines
+
+def rebuild_raw(cache, keys_path, dest):
+	"""
+	Rebuilds the DoubleDummy output of a shard from the cache alone, using the (deals, samples) keys of the shard
+	(0 for the samples a deal does not have).
+	"""
+	keys = np.load(keys_path)
+	counts = (keys != 0).sum(axis = 1)
+	present = keys.reshape(-1) != 0
+	packed, tricks = cache.records_of(keys.reshape(-1)[present])
+	owners = np.zeros((keys.size, 52), dtype = np.uint8)
+	solved = np.zeros((keys.size, strains), dtype = np.int8)
+	owners[present] = unpack_deals(packed)
+	solved[present] = tricks[:, :, 0]
+	with open(dest, "w") as f:
+		f.writelines(format_records(owners.reshape(keys.shape + (52,)), solved.reshape(keys.shape + (strains,)), counts))
+
+def get_arguments_from_command_line():
+	parser = ArgumentParser()
+	parser.add_argument("cache", help = "Directory of the cache")
+	parser.add_argument("--max_entries", type = int, default = None, help = "Resize the cache to a new size cap")
+	parser.add_argument("--rebuild", nargs = 2, metavar = ("KEYS", "DEST"), default = None,
+			help = "Rebuild the raw DoubleDummy output of a shard from its .keys.npy file")
+	return parser.parse_args()
+
+def main():
+	args = get_arguments_from_command_line()
+	if not os.path.exists(os.path.join(args.cache, "meta.json")):
+		raise SystemExit("No cache in {}".format(args.cache))
+	cache = DoubleDummyCache(args.cache, args.max_entries)
+	if args.rebuild:
+		rebuild_raw(cache, *args.rebuild)
+		cache.flush()
+	print(json.dumps(cache.stats(), indent = 4))
+
+if __name__ == "__main__":
+	main()
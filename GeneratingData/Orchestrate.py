@@ -0,0 +1,232 @@
+import os
+import sys
+import subprocess
+from time import time
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+
+from ProcessDoubleDummy import process
+from ScoreDoubleDummy import standard_errors
+from SampleDeals import sample_deals, complete_deals
+from DoubleDummyCache import DoubleDummyCache, pack_deals, solve, format_records, deal_keys, strains
+
+# Every shard goes through the stages in order, each stage depending on the previous one.
+stages = ["generate", "process"]
+
+def marker_path(config, stage, shard):
+	return os.path.join(config["data_dir"], "Data-{}.{}.done".format(shard, stage))
+
+def shard_path(config, shard, extension):
+	return os.path.join(config["data_dir"], "Data-{}.{}".format(shard, extension))
+
+def generate(config, shard):
+	"""
+	Runs the double dummy solver for one shard, writing its raw output.
+	"""
+	raw_path = shard_path(config, shard, "raw")
+	environment = dict(os.environ, OMP_NUM_THREADS = str(config["solver_threads"]))
+	with open(raw_path + ".partial", "w") as f:
+		subprocess.check_call([config["executable"], str(shard * config["count"]), str(config["count"])],
+					stdout = f, env = environment)
+	os.replace(raw_path + ".partial", raw_path)
+
+def sample_shard(config, shard):
+	"""
+	Deals the games of a shard from a Generator seeded by the shard: count N/S hands with samples E/W hands each.
+	Returns the (count, samples, 52) owners of the cards (0 North, 1 East, 2 South, 3 West).
+	"""
+	return sample_deals(config["count"], config["samples"], np.random.default_rng([config["seed"], shard]))
+
+def prepare_shard(config, cache, shard):
+	"""
+	Deals a shard and looks its games up in the cache, if any. Runs on the main process, which owns the cache.
+	Returns the owners and the (count, samples, strains) tricks with North on lead, -1 for the games to solve.
+	"""
+	owners = sample_shard(config, shard)
+	if cache is None:
+		return owners, np.full(owners.shape[:2] + (strains,), -1, dtype = np.int8)
+	_, tricks = cache.lookup(pack_deals(owners.reshape(-1, 52)))
+	return owners, tricks[:, :, 0].reshape(owners.shape[:2] + (-1,))
+
+def adapt_samples(config, shard, owners, tricks):
+	"""
+	Deals and solves one more E/W sample at a time for the deals of a shard whose best bids' IMP estimates
+	have a standard error above max_error, until every deal is below it or has max_samples samples.
+	Returns the owners and tricks padded to (count, max_samples, ...), the number of samples of every deal
+	and the indices (into the padded games) of the games solved here.
+	"""
+	count, samples = owners.shape[:2]
+	max_samples = max(config["max_samples"], samples)
+	all_owners = np.zeros((count, max_samples, 52), dtype = np.uint8)
+	all_tricks = np.zeros((count, max_samples, strains), dtype = np.int8)
+	all_owners[:, :samples] = owners
+	all_tricks[:, :samples] = tricks
+	counts = np.full(count, samples)
+	solved = []
+	# The extra samples of a shard are dealt from their own seed, so regenerating a shard deals them again.
+	rng = np.random.default_rng([config["seed"], shard, 1])
+	while True:
+		errors = standard_errors(all_tricks, counts, config["vulnerable"])
+		uncertain = np.flatnonzero((errors > config["max_error"]) & (counts < max_samples))
+		if len(uncertain) == 0:
+			return all_owners, all_tricks, counts, np.concatenate(solved or [np.zeros(0, dtype = np.int64)])
+		games = complete_deals(all_owners[uncertain, 0], 1, rng)[:, 0]
+		all_owners[uncertain, counts[uncertain]] = games
+		all_tricks[uncertain, counts[uncertain]] = solve(config["executable"], games, config["solver_threads"])
+		solved.append(uncertain * max_samples + counts[uncertain])
+		counts[uncertain] += 1
+
+def generate_dealt(config, shard, owners, tricks):
+	"""
+	Solves the games of a dealt shard the cache did not hold and, with a max_error, the extra samples of its
+	uncertain deals (see adapt_samples). Writes its raw output and the keys of its games, 0 for the samples
+	a deal does not have. Returns the packed deals and tricks of the newly solved games.
+	"""
+	games = owners.reshape(-1, 52)
+	tricks = tricks.reshape(len(games), -1)
+	misses = np.flatnonzero(np.any(tricks < 0, axis = 1))
+	tricks[misses] = solve(config["executable"], games[misses], config["solver_threads"])
+	tricks = tricks.reshape(owners.shape[:2] + (-1,))
+	counts = np.full(len(owners), owners.shape[1])
+	if config["max_error"] is not None:
+		samples = owners.shape[1]
+		owners, tricks, counts, extra = adapt_samples(config, shard, owners, tricks)
+		misses = np.concatenate([misses // samples * owners.shape[1] + misses % samples, extra])
+		games = owners.reshape(-1, 52)
+
+	keys = np.where(np.arange(owners.shape[1]) < counts.reshape(-1, 1),
+			deal_keys(pack_deals(games)).reshape(owners.shape[:2]), np.uint64(0))
+	raw_path = shard_path(config, shard, "raw")
+	with open(raw_path + ".partial", "w") as f:
+		f.writelines(format_records(owners, tricks, counts))
+	with open(shard_path(config, shard, "keys.partial.npy"), "wb") as f:
+		np.save(f, keys)
+	os.replace(shard_path(config, shard, "keys.partial.npy"), shard_path(config, shard, "keys.npy"))
+	os.replace(raw_path + ".partial", raw_path)
+	return pack_deals(games[misses]), tricks.reshape(len(games), -1)[misses]
+
+def post_process(config, shard):
+	"""
+	Cleans, scores and vectorises the raw output of one shard.
+	"""
+	npy_path = shard_path(config, shard, "npy")
+	partial_path = shard_path(config, shard, "partial.npy")
+	process(shard_path(config, shard, "raw"), partial_path, vulnerable = config["vulnerable"],
+		packed = config["packed"], counts_path = shard_path(config, shard, "samples.npy"))
+	os.replace(partial_path, npy_path)
+
+def run_stage(config, stage, shard, prepared = None):
+	"""
+	Runs one stage of one shard and marks it as done. Executed on a worker process.
+	prepared holds the games of a shard dealt on the main process (see prepare_shard).
+	"""
+	start = time()
+	result = None
+	if stage == "generate" and prepared is not None:
+		result = generate_dealt(config, shard, *prepared)
+	elif stage == "generate":
+		generate(config, shard)
+	else:
+		post_process(config, shard)
+	open(marker_path(config, stage, shard), "w").close()
+	return stage, shard, time() - start, result
+
+def next_stage(config, shard):
+	"""
+	Returns the first stage of a shard that has not been marked as done, or None.
+	"""
+	for stage in stages:
+		if not os.path.exists(marker_path(config, stage, shard)):
+			return stage
+	return None
+
+def orchestrate(config, shards, workers):
+	"""
+	Runs every pending stage of every shard on a bounded process pool, submitting a shard's next stage
+	as soon as the previous one finishes. Shards and stages already marked as done are skipped.
+	With a cache or a max_error, the games are dealt (and looked up in the cache) here before the solver runs
+	on the workers, and the newly solved games are cached here as they complete.
+	"""
+	cache = DoubleDummyCache(config["cache"], config["cache_entries"]) if config["cache"] else None
+	deal_here = cache is not None or config["max_error"] is not None
+
+	def submit(pool, stage, shard):
+		prepared = None
+		if deal_here and stage == "generate":
+			prepared = prepare_shard(config, cache, shard)
+		return pool.submit(run_stage, config, stage, shard, prepared)
+
+	pending = {shard: next_stage(config, shard) for shard in shards}
+	pending = {shard: stage for shard, stage in pending.items() if stage is not None}
+	total = sum(len(stages) - stages.index(stage) for stage in pending.values())
+	print("{} of {} shards complete, {} stages to run on {} workers".format(
+		len(shards) - len(pending), len(shards), total, workers))
+
+	start = time()
+	completed = 0
+	processed = 0
+	with ProcessPoolExecutor(max_workers = workers) as pool:
+		running = set(submit(pool, stage, shard) for shard, stage in pending.items())
+		while running:
+			done, running = wait(running, return_when = FIRST_COMPLETED)
+			for future in done:
+				stage, shard, elapsed, result = future.result()
+				completed += 1
+				if result is not None and cache is not None:
+					packed, tricks = result
+					solved = np.full((len(packed), tricks.shape[1], 4), -1, dtype = np.int8)
+					solved[:, :, 0] = tricks
+					cache.insert(packed, solved)
+					cache.flush()
+				if stage == "process":
+					processed += config["count"]
+				elapsed_total = time() - start
+				print("[{}/{}] shard {} {} in {:.1f}s, {:.1f} deals/s overall".format(
+					completed, total, shard, stage, elapsed, processed / elapsed_total))
+				sys.stdout.flush()
+
+				stage = next_stage(config, shard)
+				if stage is not None:
+					running.add(submit(pool, stage, shard))
+
+	if cache is not None:
+		cache.flush()
+		print("Cache: {}".format(cache.stats()))
+
+def get_arguments_from_command_line():
+	parser = ArgumentParser()
+	parser.add_argument("--shards", type = int, default = 16, help = "Number of shards to generate")
+	parser.add_argument("--count", type = int, default = 10, help = "Number of NS hands per shard")
+	parser.add_argument("--data_dir", default = "Data", help = "Directory for the shards")
+	parser.add_argument("--executable", default = "GeneratingData/DoubleDummy", help = "Compiled DoubleDummy solver")
+	parser.add_argument("--workers", type = int, default = os.cpu_count(), help = "Number of worker processes")
+	parser.add_argument("--solver_threads", type = int, default = 1, help = "OpenMP threads per solver process")
+	parser.add_argument("--vulnerable", action = "store_true", help = "Score the contracts as vulnerable")
+	parser.add_argument("--packed", action = "store_true", help = "Write the compact packed format")
+	parser.add_argument("--cache", default = None,
+			help = "Directory of a double dummy cache: deal the games here and only solve the ones not cached")
+	parser.add_argument("--cache_entries", type = int, default = None, help = "Size cap of the cache in deals")
+	parser.add_argument("--samples", type = int, default = 5,
+			help = "E/W samples per N/S hand when dealing with a cache (the first samples with --max_error)")
+	parser.add_argument("--seed", type = int, default = 0, help = "Seed of the games dealt with a cache")
+	parser.add_argument("--max_error", type = float, default = None,
+			help = "Deal more E/W samples until the standard error of the IMP of a hand's best bids is below this")
+	parser.add_argument("--max_samples", type = int, default = 16, help = "Most E/W samples per N/S hand with --max_error")
+	return parser.parse_args()
+
+def main():
+	args = get_arguments_from_command_line()
+	if not os.path.exists(args.data_dir):
+		os.makedirs(args.data_dir)
+	config = {"data_dir": args.data_dir, "executable": os.path.abspath(args.executable), "count": args.count,
+		"solver_threads": args.solver_threads, "vulnerable": args.vulnerable, "packed": args.packed,
+		"cache": args.cache, "cache_entries": args.cache_entries, "samples": args.samples, "seed": args.seed,
+		"max_error": args.max_error, "max_samples": args.max_samples}
+	if args.max_error is not None and args.samples < 2:
+		raise SystemExit("--max_error needs at least 2 --samples to estimate the standard error")
+	orchestrate(config, list(range(args.shards)), args.workers)
+
+if __name__ == "__main__":
+	main()
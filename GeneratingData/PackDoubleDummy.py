@@ -0,0 +1,49 @@
+from argparse import ArgumentParser
+from numpy import dtype, uint8, int8, empty, load, packbits, unpackbits, round, concatenate, float64
+from numpy.lib.format import open_memmap
+
+# 50 bytes per deal: the N and S hands as 52 bits each and the 36 IMPs as int8 in [-24, 24].
+packed_dtype = dtype([("N", uint8, (7,)), ("S", uint8, (7,)), ("IMP", int8, (36,))])
+
+def pack_rows(north, south, imps):
+	"""
+	Packs one hot (deals, 52) hands and integer (deals, 36) IMPs into an array of packed_dtype.
+	"""
+	packed = empty(len(imps), dtype = packed_dtype)
+	packed["N"] = packbits(north.astype(uint8), axis = 1)
+	packed["S"] = packbits(south.astype(uint8), axis = 1)
+	packed["IMP"] = imps
+	return packed
+
+def pack_vectorised(rows):
+	"""
+	Packs rows in the 140 wide float64 format written by VectoriseDoubleDummy.py.
+	"""
+	imps = round(rows[:, 104:] * 48.0 - 24.0).astype(int8)
+	return pack_rows(rows[:, :52], rows[:, 52:104], imps)
+
+def unpack_rows(packed):
+	"""
+	Expands packed deals back into the 140 wide float64 format written by VectoriseDoubleDummy.py.
+	"""
+	north = unpackbits(packed["N"], axis = 1, count = 52)
+	south = unpackbits(packed["S"], axis = 1, count = 52)
+	return concatenate([north, south, (packed["IMP"] + 24.0) / 48.0], axis = 1).astype(float64)
+
+def get_arguments_from_command_line():
+	parser = ArgumentParser()
+	parser.add_argument("src", help = "Vectorised .npy file written by VectoriseDoubleDummy.py")
+	parser.add_argument("dest", help = "Packed .npy file to write")
+	parser.add_argument("--batch_size", type = int, default = 65536, help = "Rows converted at a time")
+	return parser.parse_args()
+
+def main():
+	args = get_arguments_from_command_line()
+	rows = load(args.src, mmap_mode = "r")
+	packed = open_memmap(args.dest, mode = "w+", dtype = packed_dtype, shape = (len(rows),))
+	for offset in range(0, len(rows), args.batch_size):
+		packed[offset : offset + args.batch_size] = pack_vectorised(rows[offset : offset + args.batch_size])
+	packed.flush()
+
+if __name__ == "__main__":
+	main()
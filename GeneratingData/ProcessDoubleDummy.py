@@ -0,0 +1,125 @@
+from json import dumps
+from argparse import ArgumentParser
+from numpy import concatenate, float64, uint8
+from numpy.lib.format import open_memmap
+
+from CleanDoubleDummy import transform_line, read_records, count_records
+from ScoreDoubleDummy import get_tricks_array, get_sample_counts, score_tricks, get_hand_matrix
+from PackDoubleDummy import packed_dtype, pack_rows
+
+class JsonStream:
+	"""
+	Writes a {idx: entry} JSON object one entry at a time, so that debug output needs no more memory than a batch.
+	"""
+	def __init__(self, path):
+		self.f = open(path, "w") if path else None
+		self.count = 0
+		if self.f:
+			self.f.write("{")
+
+	def write(self, entries):
+		if self.f:
+			for entry in entries:
+				self.f.write("{}\n\t\"{}\": {}".format("," if self.count else "", self.count, dumps(entry)))
+				self.count += 1
+
+	def close(self):
+		if self.f:
+			self.f.write("\n}\n")
+			self.f.close()
+
+def normalise_imps(imps):
+	"""
+	Maps IMPs from [-24, 24] to [0, 1].
+	"""
+	return (imps + 24.0) / 48.0
+
+def vectorise_batch(games, vulnerable = False, samples = None):
+	"""
+	Scores and vectorises a batch of cleaned games.
+	Every game is averaged over its own number of E/W samples, unless samples is given.
+	Returns the rows of the vectorised data, the hands and IMP vectors and the sample counts of the batch.
+	"""
+	max_tricks = [game["MaxTricks"] for game in games]
+	counts = get_sample_counts(max_tricks)
+	imps = score_tricks(get_tricks_array(max_tricks), vulnerable, samples, counts)
+	north = get_hand_matrix([game["N"] for game in games])
+	south = get_hand_matrix([game["S"] for game in games])
+	return concatenate([north, south, normalise_imps(imps)], axis = 1), north, south, imps, counts
+
+def process(src, dest, batch_size = 4096, vulnerable = False, samples = None,
+		clean_json = None, score_json = None, packed = False, counts_path = None):
+	"""
+	Streams a DoubleDummy output file into a vectorised .npy file, batch_size records at a time.
+	Parameters:
+		Necessary:
+			src: Path to the .raw output of DoubleDummy.
+			dest: Path of the .npy file to write.
+		Optional:
+			batch_size: Number of records held in memory at once.
+			vulnerable: Whether the declaring side is vulnerable.
+			samples: Number of E/W samples per hand (Default: the number of samples in each record).
+			clean_json: Path to write the output of CleanDoubleDummy.py to (debugging only).
+			score_json: Path to write the output of ScoreDoubleDummy.py to (debugging only).
+			packed: Write the compact packed_dtype format instead of 140 float64 values per deal.
+			counts_path: Path of a .npy file to write the number of E/W samples of every deal to.
+	"""
+	records = count_records(src)
+	if packed:
+		data = open_memmap(dest, mode = "w+", dtype = packed_dtype, shape = (records,))
+	else:
+		data = open_memmap(dest, mode = "w+", dtype = float64, shape = (records, 140))
+	sample_counts = open_memmap(counts_path, mode = "w+", dtype = uint8, shape = (records,)) if counts_path else None
+	clean_stream = JsonStream(clean_json)
+	score_stream = JsonStream(score_json)
+
+	def flush(batch, offset):
+		games = [transform_line(record) for record in batch]
+		clean_stream.write(games)
+		rows, north, south, imps, counts = vectorise_batch(games, vulnerable, samples)
+		data[offset : offset + len(rows)] = pack_rows(north, south, imps) if packed else rows
+		if sample_counts is not None:
+			sample_counts[offset : offset + len(rows)] = counts
+		score_stream.write({"N": n.tolist(), "S": s.tolist(), "IMP": imp.tolist()}
+					for n, s, imp in zip(north, south, imps))
+		return offset + len(rows)
+
+	offset = 0
+	batch = []
+	with open(src, "r") as f:
+		for record in read_records(f):
+			batch.append(record)
+			if len(batch) == batch_size:
+				offset = flush(batch, offset)
+				batch = []
+		if batch:
+			offset = flush(batch, offset)
+
+	data.flush()
+	if sample_counts is not None:
+		sample_counts.flush()
+	clean_stream.close()
+	score_stream.close()
+	return offset
+
+def get_arguments_from_command_line():
+	parser = ArgumentParser()
+	parser.add_argument("src")
+	parser.add_argument("dest")
+	parser.add_argument("--batch_size", type = int, default = 4096, help = "Records processed at a time")
+	parser.add_argument("--vulnerable", action = "store_true", help = "Score the contracts as vulnerable")
+	parser.add_argument("--samples", type = int, default = None,
+			help = "Number of E/W samples per hand (Default: the number of samples in each record)")
+	parser.add_argument("--packed", action = "store_true", help = "Write the compact packed format")
+	parser.add_argument("--counts", default = None, help = "Also write the number of E/W samples of every deal as .npy")
+	parser.add_argument("--clean_json", default = None, help = "Also write the cleaned hands as JSON (debugging)")
+	parser.add_argument("--score_json", default = None, help = "Also write the scored hands as JSON (debugging)")
+	return parser.parse_args()
+
+def main():
+	args = get_arguments_from_command_line()
+	process(args.src, args.dest, args.batch_size, args.vulnerable, args.samples,
+		args.clean_json, args.score_json, args.packed, args.counts)
+
+if __name__ == "__main__":
+	main()
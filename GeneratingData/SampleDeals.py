@@ -0,0 +1,95 @@
+import os
+from argparse import ArgumentParser
+
+import numpy as np
+
+# Deals N/S hands and their E/W completions in batches. A game is the owner of each of its cards
+# (0 North, 1 East, 2 South, 3 West), indexed 13 * suite + rank - 2 as in ScoreDoubleDummy.get_hand_vector,
+# which is the input of DoubleDummy --stdin and of DoubleDummyCache.pack_deals.
+
+# Owners of the positions of a dealt pack (the E/W cards marked 1 until their completions are dealt),
+# and of the positions of the 26 E/W cards.
+north_south_pattern = np.array([0] * 13 + [2] * 13 + [1] * 26, dtype = np.uint8)
+east_west_pattern = np.array([1] * 13 + [3] * 13, dtype = np.uint8)
+
+def permutations(shape, size, rng):
+	"""
+	Returns an array of the given shape plus (size,) holding independent random permutations of range(size),
+	by sorting uniform random keys along the last axis.
+	"""
+	return np.argsort(rng.random(tuple(shape) + (size,)), axis = -1)
+
+def sample_deals(count, samples, rng):
+	"""
+	Deals count N/S hands and samples E/W completions of each.
+	Returns the (count, samples, 52) owners of the cards; the samples of a deal share the N and S hands.
+	"""
+	# Dealing a pattern of owners through a random permutation gives each card a uniformly random owner
+	# with 13 cards per hand, without scattering card indices.
+	return complete_deals(north_south_pattern[permutations((count,), 52, rng)], samples, rng)
+
+def complete_deals(deals, samples, rng):
+	"""
+	Deals samples E/W completions of the N/S hands of (count, 52) owners (their E/W cards held by either of 1 or 3).
+	Returns the (count, samples, 52) owners of the cards.
+	"""
+	count = len(deals)
+	owners = np.repeat(np.where(deals == 3, 1, deals).astype(np.uint8).reshape(count, 1, 52), samples, axis = 1)
+	# The E/W cards of a game in card order, each given an owner from a shuffled E/W pattern.
+	owners[owners == 1] = east_west_pattern[permutations((count, samples), 26, rng)].reshape(-1)
+	return owners
+
+def hand_cards(owners, hand):
+	"""
+	Returns the sorted card indices (owners.shape[:-1] + (13,)) of a hand (0 North, 1 East, 2 South, 3 West).
+	"""
+	return np.nonzero(owners == hand)[-1].reshape(owners.shape[:-1] + (13,))
+
+def hand_vectors(owners, hand, dtype = np.float64):
+	"""
+	Returns the one hot 52 dimensional vectors of a hand, as ScoreDoubleDummy.get_hand_vector.
+	"""
+	return (owners == hand).astype(dtype)
+
+def iterate_deals(count, samples, seed, batch_size = 100000):
+	"""
+	Yields the owners of the cards of count deals (see sample_deals), batch_size deals at a time.
+	Batch b is dealt from a Generator seeded by [seed, b], so any batch can be regenerated on its own.
+	"""
+	for batch, offset in enumerate(range(0, count, batch_size)):
+		yield sample_deals(min(batch_size, count - offset), samples, np.random.default_rng([seed, batch]))
+
+def write_deals(path, count, samples, seed, batch_size = 100000):
+	"""
+	Deals count N/S hands with samples E/W completions each and writes
+		path.bin: the owners of the cards of every game, 52 bytes per game, the input of DoubleDummy --stdin
+		path.npy: the (count, 104) one hot N and S hand vectors, as uint8
+	"""
+	hands = np.lib.format.open_memmap(path + ".npy.partial", mode = "w+", dtype = np.uint8, shape = (count, 104))
+	offset = 0
+	with open(path + ".bin.partial", "wb") as f:
+		for owners in iterate_deals(count, samples, seed, batch_size):
+			f.write(owners.tobytes())
+			hands[offset : offset + len(owners), :52] = hand_vectors(owners[:, 0], 0, np.uint8)
+			hands[offset : offset + len(owners), 52:] = hand_vectors(owners[:, 0], 2, np.uint8)
+			offset += len(owners)
+	hands.flush()
+	del hands
+	os.replace(path + ".bin.partial", path + ".bin")
+	os.replace(path + ".npy.partial", path + ".npy")
+
+def get_arguments_from_command_line():
+	parser = ArgumentParser()
+	parser.add_argument("path", help = "Output path, written as <path>.bin (owners) and <path>.npy (N/S hand vectors)")
+	parser.add_argument("--count", type = int, default = 1000000, help = "Number of N/S deals")
+	parser.add_argument("--samples", type = int, default = 5, help = "E/W completions per deal")
+	parser.add_argument("--seed", type = int, default = 0)
+	parser.add_argument("--batch_size", type = int, default = 100000, help = "Deals dealt at a time")
+	return parser.parse_args()
+
+def main():
+	args = get_arguments_from_command_line()
+	write_deals(args.path, args.count, args.samples, args.seed, args.batch_size)
+
+if __name__ == "__main__":
+	main()
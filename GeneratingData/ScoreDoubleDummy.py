@@ -1,9 +1,12 @@
 from json import load, dump
-from multiprocessing import Pool
 from argparse import ArgumentParser
-from numpy import zeros, round
+from numpy import zeros, round, array, asarray, arange, searchsorted, abs, sqrt, maximum, argsort, take_along_axis, int64
 
-def score(input_tuple):
+# Lower bound (in points) of every IMP from 1 to 24.
+imp_thresholds = array([20, 50, 90, 130, 170, 220, 270, 320, 370, 430, 500, 600, 750,
+			900, 1100, 1300, 1500, 1750, 2000, 2250, 2500, 3000, 3500, 4000])
+
+def score(input_tuple, vulnerable = False):
 	bid_tricks, trump, max_tricks = input_tuple
 	declarer_score = 0
 	defender_score = 0
@@ -51,95 +54,108 @@ def score(input_tuple):
 	# Were there penalty points?
 	if max_tricks < (bid_tricks+6):
 		under_tricks = bid_tricks + 6 - max_tricks
-		defender_score += 50 * under_tricks
+		defender_score += (100 if vulnerable else 50) * under_tricks
 
 	# Was there a slam?
 	if max_tricks == 12:
-		declarer_score += 500
+		declarer_score += 750 if vulnerable else 500
 	elif max_tricks == 13:
-		declarer_score += 1000
+		declarer_score += 1500 if vulnerable else 1000
 
 	# Converting to IMP
-	diff = abs(declarer_score - defender_score)
-	imp = 0
-	if diff >= 20 and diff < 50:
-		imp = 1
-	elif diff >= 50 and diff < 90:
-		imp = 2
-	elif diff >= 90 and diff < 130:
-		imp = 3
-	elif diff >= 130 and diff < 170:
-		imp = 4
-	elif diff >= 170 and diff < 220:
-		imp = 5
-	elif diff >= 220 and diff < 270:
-		imp = 6
-	elif diff >= 270 and diff < 320:
-		imp = 7
-	elif diff >= 320 and diff < 370:
-		imp = 8
-	elif diff >= 370 and diff < 430:
-		imp = 9
-	elif diff >= 430 and diff < 500:
-		imp = 10
-	elif diff >= 500 and diff < 600:
-		imp = 11
-	elif diff >= 600 and diff < 750:
-		imp = 12
-	elif diff >= 750 and diff < 900:
-		imp = 13
-	elif diff >= 900 and diff < 1100:
-		imp = 14
-	elif diff >= 1100 and diff < 1300:
-		imp = 15
-	elif diff >= 1300 and diff < 1500:
-		imp = 16
-	elif diff >= 1500 and diff < 1750:
-		imp = 17
-	elif diff >= 1750 and diff < 2000:
-		imp = 18
-	elif diff >= 2000 and diff < 2250:
-		imp = 19
-	elif diff >= 2250 and diff < 2500:
-		imp = 20
-	elif diff >= 2500 and diff < 3000:
-		imp = 21
-	elif diff >= 3000 and diff < 3500:
-		imp = 22
-	elif diff >= 3500 and diff < 4000:
-		imp = 23
-	elif diff >= 4000:
-		imp = 24
+	imp = int(searchsorted(imp_thresholds, abs(declarer_score - defender_score), side = "right"))
 
 	if declarer_score > defender_score:
 		return imp
 	else:
-		return (-1) * imp 
-
-def precompute_scores():
-	input_space = [(bid_tricks, trump, max_tricks)  for bid_tricks in range(1,8) 
-							for max_tricks in range(14)
-							for trump in range(5) ]
-
-	pool = Pool()
-	score_space = pool.map(score, input_space)
-	pool.close()
+		return (-1) * imp
+
+score_tables = {}
+
+def get_score_table(vulnerable = False):
+	"""
+	Returns the (bid_tricks, trump, max_tricks) -> IMP lookup tensor of shape (8, 5, 14).
+	Row 0 is unused so that the tensor can be indexed by the number of tricks bid directly.
+	"""
+	if vulnerable not in score_tables:
+		table = zeros((8, 5, 14), dtype = int64)
+		for bid_tricks in range(1,8):
+			for trump in range(5):
+				for max_tricks in range(14):
+					table[bid_tricks, trump, max_tricks] = score((bid_tricks, trump, max_tricks), vulnerable)
+		score_tables[vulnerable] = table
+	return score_tables[vulnerable]
 
-	scorer = dict(zip(input_space, score_space))
-	del input_space, score_space
-	return scorer
-
-
-scores = precompute_scores()
 suit_offset = {0:3, 1:2, 2:1, 3:0, 4:4}
 
-def get_score_vector(max_tricks):
-	bid_vector = zeros(36)
-	for occurence in max_tricks:
-		for suit, trump in enumerate(occurence):
-			for bid_tricks in range(1,8):
-				bid_vector[(bid_tricks-1)*5 + suit_offset[suit] + 1] += scores[(bid_tricks, trump[0], trump[1])]
-	return round(bid_vector / 5).astype(int)
+# Number of tricks bid and trump of every bid in the 36 dimensional vector, excluding the pass at index 0.
+bid_level = arange(35) // 5 + 1
+bid_trump = array([trump for offset in range(35) for trump in suit_offset if suit_offset[trump] == offset % 5])
+
+def get_tricks_array(max_tricks):
+	"""
+	Converts the MaxTricks lists of a set of hands into an integer array of shape (deals, samples, strains).
+	Hands with fewer samples than the others are padded with zero tricks (see get_sample_counts).
+	"""
+	counts = get_sample_counts(max_tricks)
+	if len(set(counts.tolist())) <= 1:
+		return asarray([[[trump[1] for trump in occurence] for occurence in hand] for hand in max_tricks], dtype = int64)
+	tricks = zeros((len(max_tricks), counts.max(), 5), dtype = int64)
+	for idx, hand in enumerate(max_tricks):
+		tricks[idx, :len(hand)] = [[trump[1] for trump in occurence] for occurence in hand]
+	return tricks
+
+def get_sample_counts(max_tricks):
+	"""
+	Returns the number of E/W samples in the MaxTricks list of every hand.
+	"""
+	return asarray([len(hand) for hand in max_tricks], dtype = int64)
+
+def sample_imps(tricks, vulnerable = False, counts = None):
+	"""
+	Returns the (deals, samples, 35) IMPs of every bid but the pass in every sample,
+	zero for the samples beyond the counts of a deal.
+	"""
+	tricks = asarray(tricks)
+	imps = get_score_table(vulnerable)[bid_level, bid_trump, tricks[:, :, bid_trump]]
+	if counts is not None:
+		imps *= (arange(tricks.shape[1]) < asarray(counts).reshape(-1, 1)).reshape(tricks.shape[:2] + (1,))
+	return imps
+
+def score_tricks(tricks, vulnerable = False, samples = None, counts = None):
+	"""
+	Computes the 36 dimensional IMP vector of every deal in one gather.
+	Parameters:
+		Necessary:
+			tricks: Integer array of shape (deals, samples, strains) holding the double dummy tricks.
+		Optional:
+			vulnerable: Whether the declaring side is vulnerable.
+			samples: Number of E/W samples to average over (Default: tricks.shape[1]).
+			counts: Number of E/W samples of every deal, when the deals have different numbers of samples
+				(only the first counts samples of a deal are used).
+	"""
+	tricks = asarray(tricks)
+	if samples is None:
+		samples = tricks.shape[1] if counts is None else asarray(counts).reshape(-1, 1)
+	bid_vector = zeros((tricks.shape[0], 36))
+	bid_vector[:, 1:] = sample_imps(tricks, vulnerable, counts).sum(axis = 1)
+	return round(bid_vector / samples).astype(int)
+
+def standard_errors(tricks, counts, vulnerable = False, top = 3):
+	"""
+	Returns the largest standard error of the mean IMP of the top best bids of every deal,
+	estimated from its first counts samples (at least 2).
+	"""
+	counts = asarray(counts).reshape(-1, 1)
+	imps = sample_imps(tricks, vulnerable, counts)
+	mean = imps.sum(axis = 1) / counts
+	squares = (imps ** 2).sum(axis = 1) / counts
+	variance = maximum(squares - mean ** 2, 0) * counts / maximum(counts - 1, 1)
+	best = argsort(-mean, axis = 1)[:, :top]
+	return sqrt(take_along_axis(variance, best, axis = 1) / counts).max(axis = 1)
+
+def get_score_vector(max_tricks, vulnerable = False, samples = None):
+	return score_tricks(get_tricks_array([max_tricks]), vulnerable, samples)[0]
 
 def get_hand_vector(hand):
 	hand_vector = zeros(52)
@@ -147,30 +163,43 @@ def get_hand_vector(hand):
 		hand_vector[13*card[0] + card[1] - 2] = 1
 	return hand_vector
 
-def vectorise_game(hand):
-	hand["IMP"] = get_score_vector(hand["MaxTricks"]).tolist()
-	hand["N"] = get_hand_vector(hand["N"]).tolist()
-	hand["S"] = get_hand_vector(hand["S"]).tolist()
-	del hand["MaxTricks"]
-	return hand
-
-def get_paths_from_command_line():
+def get_hand_matrix(hands):
+	"""
+	Vectorises a list of hands (each a list of (suite, rank) cards) into a (deals, 52) matrix.
+	"""
+	cards = asarray(hands, dtype = int64).reshape(len(hands), -1, 2)
+	hand_matrix = zeros((len(hands), 52))
+	hand_matrix[arange(len(hands)).reshape(-1, 1), 13*cards[:, :, 0] + cards[:, :, 1] - 2] = 1
+	return hand_matrix
+
+def vectorise_games(hands, vulnerable = False, samples = None):
+	max_tricks = [hand["MaxTricks"] for hand in hands]
+	imps = score_tricks(get_tricks_array(max_tricks), vulnerable, samples, get_sample_counts(max_tricks))
+	for hand, imp in zip(hands, imps):
+		hand["IMP"] = imp.tolist()
+		hand["N"] = get_hand_vector(hand["N"]).tolist()
+		hand["S"] = get_hand_vector(hand["S"]).tolist()
+		del hand["MaxTricks"]
+	return hands
+
+def get_arguments_from_command_line():
 	parser = ArgumentParser()
-        parser.add_argument("src")
-        parser.add_argument("dest")
-        args = parser.parse_args()
-        return args.src, args.dest
+	parser.add_argument("src")
+	parser.add_argument("dest")
+	parser.add_argument("--vulnerable", action = "store_true", help = "Score the contracts as vulnerable")
+	parser.add_argument("--samples", type = int, default = None,
+			help = "Number of E/W samples per hand (Default: length of MaxTricks)")
+	return parser.parse_args()
 
 def main():
-        input_file, output_file = get_paths_from_command_line()
-	with open(input_file, "r") as f:
+	args = get_arguments_from_command_line()
+	with open(args.src, "r") as f:
 		hands = load(f)
-		hands = list(hands.values())
-		pool = Pool()
-		hands = list(pool.map(vectorise_game, hands))
-		pool.close()
-	with open(output_file,"w") as f:
+		hands = [hands[idx] for idx in sorted(hands, key = int)]
+		hands = vectorise_games(hands, args.vulnerable, args.samples)
+	with open(args.dest,"w") as f:
 		hands = {idx:hand for idx, hand in enumerate(hands)}
 		dump(hands, f, indent=4)
 
-main()
+if __name__ == "__main__":
+	main()
@@ -1,23 +1,23 @@
 import os
 import json
+from time import time
 from operator import itemgetter
 
 import numpy as np
-import tensorflow as tf
 
-from keras.models import Sequential
-from keras.layers import Dense, Activation, Dropout, BatchNormalization
-from keras.callbacks import ModelCheckpoint
-from keras.models import load_model
+from .Backends import get_backend
 
 class Agent:
 
 	def __init__(self, input_size, layers, units, output_size, mode,
-			dropout_prob = 0.2, val_split = 0.2, epochs = 20 ):
+			dropout_prob = 0.2, val_split = 0.2, epochs = 20, backend = "keras",
+			warm_start = False, patience = None, min_delta = 0.0, batch_size = 32, input_pipeline = "arrays",
+			shuffle_buffer = None, intra_op_threads = None, inter_op_threads = None, seed = None ):
 		"""
 		Initialises the neural network for mapping from state to action spaces.
 		The model consists of a series of (Leaky ReLU, Dropout, BatchNorm) layers.
 		In case mode == test, dropout probability is 0.
+		The model is run by a backend (see Backends.py), whose framework is only imported once the model is built.
 		The data directory must be organised as data_dir/X_train.npy and data_dir/Y_train.npy
 		Parameters:
 			Necessary: 
@@ -33,6 +33,26 @@ class Agent:
 					Default = 0.2
 				Epochs to Train For
 					Default = 20
+				Backend: Name of a registered backend (keras, or numpy for a light predict only engine)
+					Default = keras
+				Warm Start: Start every training run from the best weights of the previous one
+					Default = False (start from the initial weights)
+				Patience: Epochs without an improvement of the validation loss of at least Min Delta
+					after which training stops
+					Default = None (always train for all epochs)
+				Min Delta: Smallest change of the validation loss counted as an improvement
+					Default = 0.0
+				Batch Size
+					Default = 32
+				Input Pipeline: arrays (hand the arrays to the backend) or dataset (stream batches through tf.data)
+					Default = arrays
+				Shuffle Buffer: Rows shuffled together by the dataset pipeline (0 does not shuffle)
+					Default = None (all training rows)
+				Intra Op Threads, Inter Op Threads: Thread pool sizes of the backend
+					Default = None (the backend's default, all cores)
+				Seed: Seeds the initial weights, and the training of every step by (seed, episode, step),
+					making the backend deterministic
+					Default = None (unseeded)
 		"""
 		self.input_size = input_size
 		self.layers = layers
@@ -42,9 +62,28 @@ class Agent:
 		self.dropout_prob = dropout_prob
 		self.val_split = val_split
 		self.epochs = epochs
+		self.backend_name = backend
+		self.backend = None
+		self.warm_start = warm_start
+		self.patience = patience
+		self.min_delta = min_delta
+		self.epochs_used = None
+		self.batch_size = batch_size
+		self.input_pipeline = input_pipeline
+		self.shuffle_buffer = shuffle_buffer
+		self.intra_op_threads = intra_op_threads
+		self.inter_op_threads = inter_op_threads
+		self.samples_per_second = None
+		self.seed = seed
+		self.seed_seconds = None
 		self.data_dir = None
 		self.checkpoint_dir = None
-		self.model = None
+		self.initial_weights = None
+		self.best_weights = None
+		self.best_loss = None
+		self.checkpoints = None
+		self.checkpoint_key = None
+		self.val_rows = None
 
 		assert self.input_size > 0
 		assert self.layers > 1
@@ -53,6 +92,8 @@ class Agent:
 		assert self.dropout_prob >= 0 and self.dropout_prob < 1
 		assert self.val_split >= 0 and self.val_split < 1
 		assert self.mode in ["train", "predict"]
+		assert self.batch_size > 0
+		assert self.input_pipeline in ["arrays", "dataset"]
 
 		if self.mode == "predict":
 			self.dropout_prob = 0
@@ -67,13 +108,13 @@ class Agent:
 		Sets the directories for the data and checkpoints.
 		Parameters:
 			Necessary:
-				Data Directory
+				Data Directory (None if the training data is handed over in memory)
 				Checkpoint Directory
 		"""
 		self.data_dir = data_dir
 		self.checkpoint_dir = checkpoint_dir
 
-		if not os.path.exists(data_dir):
+		if data_dir is not None and not os.path.exists(data_dir):
 			os.makedirs(data_dir)
 
 		if not os.path.exists(checkpoint_dir):
@@ -82,32 +123,34 @@ class Agent:
 
 	def build_model(self):
 		"""
-		Builds the model to be used.
-		"""
-		self.model = Sequential()
-		self.model.add(Dense(self.units, input_dim = self.input_size, 
-					kernel_initializer = "truncated_normal", 
-					bias_initializer = "truncated_normal"))
-		self.model.add(Activation("relu"))
-		self.model.add(Dropout(self.dropout_prob))
-		self.model.add(BatchNormalization())
-		if self.layers > 2:
-			for i in range(self.layers - 2):
-				self.model.add(Dense(self.units, 
-								kernel_initializer='truncated_normal', 
-								bias_initializer='truncated_normal'))
-				self.model.add(Activation("relu"))
-				self.model.add(Dropout(self.dropout_prob))
-				self.model.add(BatchNormalization())
-		self.model.add(Dense(self.output_size))
-		self.model.add(Activation("relu"))
+		Creates the backend, importing its framework, and builds the model to be used.
+		"""
+		self.backend = get_backend(self.backend_name)(self)
+		self.backend.build()
 
 
 	def compile_model(self):
 		"""
 		Compiles the model with a MSE loss and an Adam optimizer.
 		"""
-		self.model.compile(optimizer = "adam", loss = "mse")
+		self.backend.compile()
+
+
+	def reset_optimizer(self):
+		"""
+		Resets the state of the optimizer of the compiled model.
+		"""
+		self.backend.reset_optimizer()
+
+
+	def train_rows(self, rows):
+		"""
+		Number of the rows that are trained on, the rest (the last val_rows if given with the training data,
+		otherwise the last val_split of the rows) being held out for validation.
+		"""
+		if self.val_rows is not None:
+			return rows - self.val_rows
+		return rows - int(rows * self.val_split)
 
 
 	def load_train_data(self):
@@ -118,12 +161,45 @@ class Agent:
 		self.X_train = np.load(data_path)
 		data_path = os.path.join(self.data_dir, "Train_Y.npy")
 		self.Y_train = np.load(data_path)
+		self.val_rows = None
+
+
+	def set_train_data(self, X, Y, val_rows = None):
+		"""
+		Hands the training data over in memory instead of reading it from the data directory.
+		val_rows is the number of last rows held out for validation (Default: the last val_split of the rows).
+		"""
+		self.X_train = X
+		self.Y_train = Y
+		self.val_rows = val_rows
+
+
+	def set_checkpoints(self, checkpoints, episode, step):
+		"""
+		Uses a CheckpointManager for saving and finding checkpoints instead of the checkpoint directory.
+		Parameters:
+			Necessary:
+				checkpoints: CheckpointManager
+				episode, step: The step checkpoints are saved for (train mode) or loaded from (predict mode).
+		"""
+		self.checkpoints = checkpoints
+		self.checkpoint_key = (episode, step)
 
 
 	def load_best_checkpoint(self):
 		"""
-		Loads the best checkpoint from the checkpoint directory.
+		Loads the best checkpoint, looked up in the manifest of the CheckpointManager if one is set and
+		from the checkpoint directory otherwise.
 		"""
+		if self.checkpoints is not None:
+			checkpoint = self.checkpoints.best(*self.checkpoint_key)
+			if checkpoint is not None:
+				self.backend.load_weights(checkpoint)
+				print("\tLoaded checkpoint {}".format(checkpoint))
+			else:
+				print("\tStarting Afresh {}".format(self.checkpoint_key))
+			return
+
 		checkpoints = [file for file in os.listdir(self.checkpoint_dir)
 				if file.endswith(".hdf5")]
 		if len(checkpoints) > 0:
@@ -132,48 +208,105 @@ class Agent:
 			checkpoints = sorted(checkpoints, key = itemgetter(1), reverse = False)
 
 			checkpoint = os.path.join(self.checkpoint_dir, checkpoints[0][0])
-			self.model = load_model(checkpoint)
+			self.backend.load_weights(checkpoint)
 			print("\tLoaded checkpoint {}".format(checkpoint))
 		else:
 			print("\tStarting Afresh {}".format(self.checkpoint_dir))
 
 
-	def setup(self, data_dir, checkpoint_dir):
+	def load_warm_start(self, checkpoints, episode, step):
+		"""
+		Loads the best checkpoint of (episode, step) into a built train mode model to warm start from,
+		e.g. when resuming. Returns whether a checkpoint was found.
+		"""
+		checkpoint = checkpoints.best(episode, step)
+		if checkpoint is None:
+			return False
+		self.backend.load_weights(checkpoint)
+		print("\tWarm starting from checkpoint {}".format(checkpoint))
+		return True
+
+
+	def setup(self, data_dir, checkpoint_dir, X = None, Y = None, load_checkpoint = True, val_rows = None):
 		"""
 		Sets the necesary directories for data and checkpoints.
 		Sets up the model by building and compiling it, as well as loading the data.
+		The model is only built and compiled once per Agent. In train mode its weights and optimizer state
+		are reset on every setup, to the best weights of the last training run with warm_start and to the
+		initial weights otherwise.
 		In case the model is to be tested, the best checkpoint is loaded as well.
 		Parameters:
 			Necessary:
 				Data Directory
 				Checkpoint Directory
+			Optional:
+				X, Y: Training data handed over in memory (Default: loaded from the data directory)
+				load_checkpoint: Whether predict mode loads the best checkpoint from disk
+					(False when the weights are synced in memory with set_weights)
+				val_rows: Number of the last rows of X held out for validation (see set_train_data)
 		"""
 		self.set_directories(data_dir, checkpoint_dir)
-		self.build_model()
-		self.compile_model()
+		if self.backend is None:
+			self.build_model()
+			self.compile_model()
+			if self.mode == "train":
+				self.initial_weights = self.backend.get_weights()
 
 		if self.mode == "train":
-			self.load_train_data()
+			if self.warm_start and self.best_weights is not None:
+				self.backend.set_weights(self.best_weights)
+			else:
+				self.backend.set_weights(self.initial_weights)
+			self.reset_optimizer()
+			if X is not None:
+				self.set_train_data(X, Y, val_rows)
+			else:
+				self.load_train_data()
 
-		if self.mode == "predict":
+		if self.mode == "predict" and load_checkpoint:
 			self.load_best_checkpoint()
 
 			
-	def train_model(self):
+	def train_model(self, save_checkpoints = True):
+		"""
+		Trains the model and keeps the weights of the best epoch in memory (see get_weights).
+		With a patience, training stops early once the validation loss has stopped improving (see epochs_used).
+		The training throughput is kept in samples_per_second, and the time spent seeding the step in seed_seconds.
+		If save_checkpoints, it also saves the checkpoints and the history as a json to the checkpoint directory.
+		With a CheckpointManager only the top-k checkpoints of the step are kept.
+		"""
+		start = time()
+		if self.seed is not None:
+			# Seeded by the step, so that a step trains the same whether or not the run was resumed before it.
+			self.backend.set_seed(int(np.random.SeedSequence([self.seed] + list(self.checkpoint_key or ())).generate_state(1)[0]))
+		self.seed_seconds = time() - start
+		start = time()
+		history, self.best_weights, self.best_loss = self.backend.fit(self.X_train, self.Y_train, save_checkpoints)
+		self.epochs_used = len(history.get("loss", []))
+		self.samples_per_second = self.train_rows(len(self.X_train)) * self.epochs_used / max(time() - start, 1e-9)
+		if save_checkpoints:
+			with open(os.path.join(self.checkpoint_dir, "history.json"), "w") as f:
+				json.dump(history, f, indent = 4)
+
+
+	def get_weights(self):
+		"""
+		Returns the weights of the best epoch of the last training run, or the current weights.
+		"""
+		if self.best_weights is not None:
+			return self.best_weights
+		return self.backend.get_weights()
+
+
+	def set_weights(self, weights):
 		"""
-		Trains the model and saves the best checkpoint to the checkpoint directory.
-		It also saves the history as a json to the checkpoint directory.
+		Sets the weights of the model in memory, e.g. to the best weights of a trainer.
 		"""
-		checkpoint_path = os.path.join(self.checkpoint_dir, "{epoch:02d}-{val_loss:.4f}.hdf5")
-		checkpointer = ModelCheckpoint(filepath = checkpoint_path, save_best_only = False, verbose = 0)
-		history = self.model.fit(self.X_train, self.Y_train, validation_split = self.val_split, 
-				epochs = self.epochs, callbacks=[checkpointer], verbose=0)
-		with open(os.path.join(self.checkpoint_dir, "history.json"), "w") as f:
-			json.dump(history.history, f, indent = 4)
+		self.backend.set_weights(weights)
 
 
 	def predict_model(self, X):
 		"""
 		Given a set of data points, this function returns the corresponding predictions.
 		"""
-		return self.model.predict(X)
+		return self.backend.predict(X)
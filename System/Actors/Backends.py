@@ -0,0 +1,25 @@
+from importlib import import_module
+
+# Model backends of the Agent, by name: (module, class).
+# A backend module is only imported when get_backend is called for it, so importing the Actors package
+# (e.g. for the DataManager or the EpsilonBandit alone) never loads a deep learning framework.
+backends = {
+	"keras": (".KerasBackend", "KerasBackend"),
+	"numpy": (".NumpyAgent", "NumpyBackend"),
+}
+
+def register_backend(name, module, attribute):
+	"""
+	Registers a backend class, importable as module.attribute (a module starting with "." is relative to this package).
+	A backend is created as backend(agent) and provides build, compile, fit, predict, get_weights,
+	set_weights and load_weights, and reset_optimizer if it trains (see KerasBackend).
+	"""
+	backends[name] = (module, attribute)
+
+def get_backend(name):
+	"""
+	Imports and returns the class of a registered backend.
+	"""
+	assert name in backends, "Unknown backend {} (registered: {})".format(name, ", ".join(sorted(backends)))
+	module, attribute = backends[name]
+	return getattr(import_module(module, __package__), attribute)
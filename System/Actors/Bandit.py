@@ -1,16 +1,52 @@
 import numpy as np
-from multiprocessing import Pool
 
 class EpsilonBandit:
-	def __init__(self, epsilon):
+	def __init__(self, epsilon, rng = None):
 		"""
 		Initialises the epsilon greedy bandit.
-		Parameters: 
+		Parameters:
 			epsilon: Probability of choosing a non optimal action
+			rng: numpy.random.Generator used for exploration (Default: a freshly seeded Generator)
 		"""
 		self.epsilon = epsilon
+		self.rng = rng if rng is not None else np.random.default_rng()
 		assert epsilon >= 0 and epsilon < 1
 
+	def legal_mask(self, prev_bid, size = 36):
+		"""
+		Returns a Episode_Size * 36 boolean matrix of the bids that may be made after prev_bid.
+		Passing (bid 0) is always legal, every other bid has to be strictly larger than prev_bid.
+		Parameters:
+			prev_bid: A Episode_Size-Dimensional Vector
+		"""
+		mask = np.arange(size) > np.asarray(prev_bid).reshape(-1, 1)
+		mask[:, 0] = True
+		return mask
+
+	def greedy(self, options, prev_bid):
+		"""
+		Chooses the best legal bid for every row of options, passing whenever passing is
+		at least as good as the best bid above prev_bid.
+		Parameters:
+			options: A Episode_Size * 36 Matrix
+			prev_bid: A Episode_Size-Dimensional Vector
+		"""
+		# argmax takes the first of equally good bids, so passing wins its ties.
+		return np.argmax(np.where(self.legal_mask(prev_bid, options.shape[1]), options, -np.inf), axis = 1)
+
+	def explore(self, prev_bid):
+		"""
+		Chooses a bid uniformly at random from the legal bids for every entry of prev_bid.
+		Parameters:
+			prev_bid: A Episode_Size-Dimensional Vector
+		"""
+		low = np.asarray(prev_bid, dtype = np.int64) + 1
+		higher = 36 - low
+		# Passing is a separate legal option unless it is already part of the range above prev_bid.
+		legal = higher + (low > 0)
+		draw = np.floor(self.rng.random(low.shape) * legal).astype(np.int64)
+		return np.where(draw < higher, low + draw, 0)
+
 	def decision(self, options, prev_bid):
 		"""
 		Takes a decision based on the relative merit of the options and the previous bid (ensuring legality of the bid made)
@@ -22,20 +58,9 @@ class EpsilonBandit:
 		assert options.shape[1] == 36
 		assert np.min(prev_bid) >= -1 and np.max(prev_bid) < 35
 
-		# prev_bid is limited to len(options) - 1 because the choice has to be made from options[prev_bid+1:]
-
-		choice = np.random.choice(np.arange(0, 2), size = prev_bid.shape,
-									p = [self.epsilon, 1 - self.epsilon] )
-
-		bid = np.zeros(prev_bid.shape)
-
-		for idx in range(len(choice)):		
-			if choice[idx] == 0:
-				offset = int(prev_bid[idx] + 1)
-				bid[idx] = np.argmax(options[idx][offset:]) + offset
-				if(options[idx][0] >= options[idx][int(bid[idx])]):
-					bid[idx] = 0
-			else:
-				bid[idx] = np.random.randint(prev_bid[idx],36)
+		explore = self.rng.random(len(prev_bid)) < self.epsilon
+		bid = self.greedy(options, prev_bid)
+		if np.any(explore):
+			bid[explore] = self.explore(np.asarray(prev_bid)[explore])
 
-		return bid
+		return bid.astype(np.int16)
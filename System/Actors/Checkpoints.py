@@ -0,0 +1,121 @@
+import os
+import json
+import tempfile
+
+class CheckpointManager:
+
+	def __init__(self, root, keep = 1, step_dir = "{}-{}"):
+		"""
+		Keeps the top-k checkpoints (by val_loss) of every (episode, step) and indexes them in a manifest,
+		so that finding the best or the latest checkpoint is a single file read instead of a directory scan.
+		Parameters:
+			Necessary:
+				root: Directory holding the checkpoints and manifest.json.
+			Optional:
+				keep: Number of checkpoints kept per step.
+				step_dir: Format string of the directory of a step, relative to root, given episode and step.
+		"""
+		self.root = root
+		self.keep = keep
+		self.step_dir = step_dir
+		self.manifest_path = os.path.join(root, "manifest.json")
+		assert self.keep > 0
+
+		if not os.path.exists(root):
+			os.makedirs(root)
+		self.manifest = self.read()
+
+	def read(self):
+		"""
+		Reads the manifest, or returns an empty one if none has been written yet.
+		"""
+		if not os.path.exists(self.manifest_path):
+			return {"latest": None, "steps": {}}
+		with open(self.manifest_path, "r") as f:
+			return json.load(f)
+
+	def write(self):
+		"""
+		Atomically replaces the manifest on disk.
+		"""
+		fd, path = tempfile.mkstemp(dir = self.root, prefix = ".manifest-", suffix = ".json")
+		with os.fdopen(fd, "w") as f:
+			json.dump(self.manifest, f, indent = 4)
+			f.flush()
+			os.fsync(f.fileno())
+		os.replace(path, self.manifest_path)
+
+	def key(self, episode, step):
+		return self.step_dir.format(episode, step)
+
+	def entries(self, episode, step):
+		"""
+		Returns the manifest entries of a step, best first.
+		"""
+		return self.manifest["steps"].get(self.key(episode, step), [])
+
+	def offer(self, episode, step, epoch, val_loss, save):
+		"""
+		Saves a checkpoint if it is among the top-k of its step, evicting the checkpoint it displaces.
+		Parameters:
+			Necessary:
+				episode, step, epoch, val_loss: Identify and rank the checkpoint.
+				save: Function writing the checkpoint to the path it is given.
+		Returns whether the checkpoint was kept.
+		"""
+		epoch, val_loss = int(epoch), float(val_loss)
+		entries = self.entries(episode, step)
+		if len(entries) >= self.keep and val_loss >= entries[-1]["val_loss"]:
+			return False
+
+		path = os.path.join(self.key(episode, step), "{:02d}-{:.4f}.hdf5".format(epoch, val_loss))
+		full_path = os.path.join(self.root, path)
+		if not os.path.exists(os.path.dirname(full_path)):
+			os.makedirs(os.path.dirname(full_path))
+		partial_path = full_path[:-len(".hdf5")] + ".partial.hdf5"
+		save(partial_path)
+		os.replace(partial_path, full_path)
+		# A weight file exported from a checkpoint previously at this path is stale.
+		self.remove_exports(full_path)
+
+		entries = [entry for entry in entries if entry["path"] != path]
+		entries.append({"episode": episode, "step": step, "epoch": epoch, "val_loss": val_loss, "path": path})
+		entries = sorted(entries, key = lambda entry: entry["val_loss"])
+		self.manifest["steps"][self.key(episode, step)] = entries[:self.keep]
+
+		latest = self.manifest["latest"]
+		if latest is None or (episode, step) >= (latest["episode"], latest["step"]):
+			self.manifest["latest"] = {"episode": episode, "step": step}
+		self.write()
+
+		for entry in entries[self.keep:]:
+			if os.path.exists(os.path.join(self.root, entry["path"])):
+				os.remove(os.path.join(self.root, entry["path"]))
+			self.remove_exports(os.path.join(self.root, entry["path"]))
+		return True
+
+	def remove_exports(self, path):
+		"""
+		Removes the files exported from the checkpoint at path (the .npz of the numpy backend, see NumpyAgent.py).
+		"""
+		exported = os.path.splitext(path)[0] + ".npz"
+		if os.path.exists(exported):
+			os.remove(exported)
+
+	def best(self, episode, step):
+		"""
+		Returns the path of the best checkpoint of a step, or None if it has none.
+		"""
+		entries = self.entries(episode, step)
+		if len(entries) == 0:
+			return None
+		return os.path.join(self.root, entries[0]["path"])
+
+	def latest(self):
+		"""
+		Returns the (episode, step) of the most recent step with a checkpoint, or None.
+		"""
+		latest = self.manifest["latest"]
+		if latest is None:
+			return None
+		return latest["episode"], latest["step"]
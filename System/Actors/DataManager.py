@@ -1,60 +1,188 @@
 import os
 import numpy as np
 
+from .Dataset import ShardedDataset
+
 class DataManager:
 
-	def __init__(self, data_path, chunks = 12, hand_vector_size = 52, monotonic_penalty = 0.0):
+	def __init__(self, data_path, chunks = None, hand_vector_size = 52, monotonic_penalty = 0.0,
+			episode_size = None, shuffle = False, rng = None, writer = None, seed = None):
 		"""
 		Initialises the vectorised data loader.
+		All chunks are memory mapped, so only the deals drawn for an episode are read into memory.
 		Parameters:
 			Necessary:
 				data_path: Expects something like "DataPath-{}.npy".
 			Optional:
-				chunks: The total number of chunks the data is split into.
+				chunks: The total number of chunks the data is split into (Default: every chunk found on disk).
 				hand_vector_size: Size of the hand feature vector.
 				monotonic_penalty: Penalty to enforce monotonically increasing bids constraint.
+				episode_size: Number of deals per episode. By default an episode uses one whole chunk,
+					otherwise episodes take consecutive windows of the corpus, crossing chunk boundaries.
+				shuffle: Draw the deals of an episode uniformly from across all chunks instead.
+				rng: numpy.random.Generator used for shuffling.
+				writer: AsyncWriter used to persist the training data in the background (Default: write synchronously).
+				seed: Shuffle the deals of every episode with a Generator seeded by (seed, episode) instead of rng,
+					so that an episode draws the same deals whenever it is read.
 		"""
 		self.data_path = data_path
-		self.chunks = chunks
+		self.dataset = ShardedDataset(data_path, chunks)
+		self.chunks = self.dataset.chunks
 		self.hand_vector_size = hand_vector_size
 		self.monotonic_penalty = monotonic_penalty
+		self.episode_size = episode_size
+		self.shuffle = shuffle
+		self.rng = rng if rng is not None else np.random.default_rng()
+		self.seed = seed
+		self.indices = None
+		self.writer = writer
 
-		self.N = None
-		self.S = None
-		self.IMP = None
-		self.BidHistory = None
+		# Episode state is kept in buffers allocated once per episode. Only the rows listed in active,
+		# the sequences that have not completed yet, are read or written by a step.
+		self.hands = None
+		self.raw_IMP = None
+		self.history = None
+		self.bids = None
+		self.X_buffer = None
+		self.active = None
+		self.X = None
+		self.train_data = None
+
+	def episode_indices(self, episode):
+		"""
+		Returns the global indices of the deals used in an episode.
+		Parameters:
+			Necessary:
+				episode: Episode of the training.
+		"""
+		if self.shuffle:
+			rng = self.rng if self.seed is None else np.random.default_rng([self.seed, episode])
+			return self.dataset.sample(self.episode_size or len(self.dataset.chunk(episode % self.chunks)), rng)
+		if self.episode_size is None:
+			chunk = episode % self.chunks
+			return np.arange(self.dataset.offsets[chunk], self.dataset.offsets[chunk + 1])
+		return self.dataset.window(episode * self.episode_size, min(self.episode_size, len(self.dataset)))
+
+	def read(self, episode):
+		"""
+		Reads and decodes the deals of an episode without touching the state of the episode being played,
+		so that it can run on a background thread (see Prefetcher.py).
+		Returns the indices, N and S hands and IMP vectors of the episode.
+		Parameters:
+			Necessary:
+				episode: Episode of the training.
+		"""
+		indices = self.episode_indices(episode)
+		if self.shuffle or self.episode_size is not None:
+			raw_data = self.dataset[indices]
+		else:
+			raw_data = np.array(self.dataset.chunk(episode % self.chunks))
+		return (indices,) + tuple(self.decode(raw_data))
+
+	def assign(self, data):
+		"""
+		Makes data returned by read the current episode.
+		Also automatically resets BidHistory and allocates the buffers of the episode.
+		"""
+		self.indices, N, S, self.raw_IMP = data
+		self.hands = (N, S)
+
+		deals, bids = self.raw_IMP.shape
+		self.history = np.zeros((deals, bids), dtype = np.uint8)
+		self.bids = np.full(deals, -1, dtype = np.int16)
+		self.X_buffer = np.empty((deals, self.hand_vector_size + bids), dtype = np.float32)
+		self.active = np.arange(deals)
 		self.X = None
-		self.PrevBid = None
 
 	def load(self, episode):
 		"""
 		Loads the data from the vectorised hand data.
-		Also automatically resets BidHistory.
+		Also automatically resets BidHistory and allocates the buffers of the episode.
 		Parameters:
 			Necessary:
 				episode: Episode of the training.
 		"""
-		path = self.data_path.format(episode % self.chunks)
-		raw_data = np.load(path)
+		self.assign(self.read(episode))
 
-		self.N = raw_data[:, :self.hand_vector_size]
-		self.S = raw_data[:, self.hand_vector_size : 2 * self.hand_vector_size]
-		self.IMP = raw_data[:, 2 * self.hand_vector_size:]
+	def snapshot(self):
+		"""
+		Returns the arrays the episode being played is restored from (see restore): the indices of its deals,
+		the bit packed bidding history, the previous bids and the active sequences.
+		"""
+		return {"indices": self.indices, "history": np.packbits(self.history, axis = 1), "bids": self.bids,
+			"active": self.active}
 
-		self.BidHistory = np.zeros(self.IMP.shape)
-		self.PrevBid = np.ones(self.N.shape[0], dtype = np.int16) * -1
+	def restore(self, arrays):
+		"""
+		Makes the episode of a snapshot the current episode, rereading its deals.
+		"""
+		indices = arrays["indices"]
+		self.assign((indices,) + tuple(self.decode(self.dataset[indices])))
+		self.history[:] = np.unpackbits(arrays["history"], axis = 1, count = self.history.shape[1])
+		self.bids[:] = arrays["bids"]
+		self.active = arrays["active"]
+
+	def decode(self, raw_data):
+		"""
+		Splits raw hand data into the N and S hands and the IMP vectors.
+		Packed data (hands as packbits, IMPs as int8, see GeneratingData/PackDoubleDummy.py) is expanded on load:
+		the hands to one hot uint8 vectors and the IMPs to normalised float32.
+		Parameters:
+			Necessary:
+				raw_data: Either a (deals, 140) float64 array or a structured array with N, S and IMP fields.
+		"""
+		if raw_data.dtype.names is None:
+			return (raw_data[:, :self.hand_vector_size],
+				raw_data[:, self.hand_vector_size : 2 * self.hand_vector_size],
+				raw_data[:, 2 * self.hand_vector_size:])
+
+		N = np.unpackbits(raw_data["N"], axis = 1, count = self.hand_vector_size)
+		S = np.unpackbits(raw_data["S"], axis = 1, count = self.hand_vector_size)
+		IMP = (raw_data["IMP"].astype(np.float32) + 24) / 48
+		return N, S, IMP
+
+	@property
+	def N(self):
+		return self.hands[0][self.active]
+
+	@property
+	def S(self):
+		return self.hands[1][self.active]
+
+	@property
+	def BidHistory(self):
+		return self.history[self.active]
+
+	@property
+	def PrevBid(self):
+		return self.bids[self.active]
+
+	@PrevBid.setter
+	def PrevBid(self, bids):
+		self.bids[self.active] = bids
+
+	@property
+	def IMP(self):
+		"""
+		The IMP vectors of the active sequences, with every bid smaller than the previous bid penalised,
+		ensuring the system learns the monotonically increasing nature of bids.
+		Since bids only increase, penalising below the latest bid covers every earlier bid as well.
+		"""
+		IMP = self.raw_IMP[self.active]
+		IMP[np.arange(IMP.shape[1]) < self.bids[self.active].reshape(-1, 1)] = self.monotonic_penalty
+		return IMP
 
 	def concatenate_data(self, step):
 		"""
-		Concatenates the appropriate hand with the bidding history.
+		Concatenates the appropriate hand with the bidding history into the preallocated X buffer.
 		Parameters:
 			Necessary:
 				step: Step in the bidding sequence.
 		"""
-		if step % 2 == 0:
-			self.X = np.concatenate([self.N, self.BidHistory], axis = 1)
-		else:
-			self.X = np.concatenate([self.S, self.BidHistory], axis = 1)
+		hand = self.hands[step % 2]
+		self.X = self.X_buffer[:len(self.active)]
+		self.X[:, :self.hand_vector_size] = hand[self.active]
+		self.X[:, self.hand_vector_size:] = self.history[self.active]
 
 	def save_data(self, data_path):
 		"""
@@ -63,51 +191,49 @@ class DataManager:
 			Necessary:
 				data_pata: Directory to save training data to.
 		"""
-		np.save(os.path.join(data_path, "Train_X.npy"), self.X)
-		np.save(os.path.join(data_path, "Train_Y.npy"), self.IMP)
-
-	def update_bid_history(self):
-		"""
-		Updates the bidding history given the previous bid.
-		"""
-		self.BidHistory[range(len(self.PrevBid)), np.asarray(self.PrevBid, dtype = int)] = 1
-
-	def remove_completed_sequences(self):
-		"""
-		Remove all bidding sequences that have completed.
-		"""
-		uncompleted_idx_mask = np.logical_and(self.PrevBid != 35, self.PrevBid != 0)
-		self.N = self.N[uncompleted_idx_mask]
-		self.S = self.S[uncompleted_idx_mask]
-		self.IMP = self.IMP[uncompleted_idx_mask]
-		self.BidHistory = self.BidHistory[uncompleted_idx_mask]
-		self.X = self.X[uncompleted_idx_mask]
-		self.PrevBid = self.PrevBid[uncompleted_idx_mask]
+		X, Y = self.train_data
+		if self.writer is not None:
+			# X is a view of the buffer the next step overwrites, so the writer gets a copy.
+			self.writer.save(os.path.join(data_path, "Train_X.npy"), np.array(X))
+			self.writer.save(os.path.join(data_path, "Train_Y.npy"), Y)
+		else:
+			if not os.path.exists(data_path):
+				os.makedirs(data_path)
+			np.save(os.path.join(data_path, "Train_X.npy"), X)
+			np.save(os.path.join(data_path, "Train_Y.npy"), Y)
 
-	def penalise_smaller_bids(self):
+	def advance(self, bids = None):
 		"""
-		Given the previous bid it penalises all smaller bids, ensuring the system learns
-		the monotonically increasing nature of bids.
+		Records the bids of the active sequences in one pass: updates the bidding history and drops the
+		sequences that have completed (passed or bid 7NT) from the active set.
+		The monotonic penalty follows from the recorded bids (see IMP). Costs O(active deals).
+		Parameters:
+			Optional:
+				bids: The bids of the active sequences (Default: the bids already set through PrevBid).
 		"""
-		for idx in range(len(self.PrevBid)):
-			self.IMP[idx,:int(self.PrevBid[idx])] = self.monotonic_penalty
+		if bids is not None:
+			self.bids[self.active] = bids
+		bids = self.bids[self.active]
+		self.history[self.active, bids] = 1
+		self.active = self.active[(bids != 35) & (bids != 0)]
 
-	def pre_step(self, step, data_path):
+	def pre_step(self, step, data_path = None):
 		"""
 		Handle one pre-prediction step of an episode.
+		The training data of the step is kept in train_data. X is only valid until the next pre_step.
 		Parameters:
 			Necessary:
 				step
-				data_path
+			Optional:
+				data_path: Directory to persist the training data to (Default: not persisted).
 		"""
 		self.concatenate_data(step)
-		self.save_data(data_path)
+		self.train_data = (self.X, self.IMP)
+		if data_path is not None:
+			self.save_data(data_path)
 
 	def post_step(self):
 		"""
 		Handles one post-prediction step of an episode.
 		"""
-		self.update_bid_history()
-		self.remove_completed_sequences()
-		self.penalise_smaller_bids()
-
+		self.advance()
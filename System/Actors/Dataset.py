@@ -0,0 +1,75 @@
+import os
+import numpy as np
+
+class ShardedDataset:
+
+	def __init__(self, data_path, chunks = None):
+		"""
+		Opens every chunk of the vectorised hand data with mmap_mode and exposes them as one logical array.
+		Only the rows that are indexed are ever read from disk.
+		Parameters:
+			Necessary:
+				data_path: Expects something like "DataPath-{}.npy".
+			Optional:
+				chunks: The total number of chunks the data is split into (Default: every consecutive chunk found on disk).
+		"""
+		self.data_path = data_path
+		if chunks is None:
+			chunks = 0
+			while os.path.exists(data_path.format(chunks)):
+				chunks += 1
+		self.chunks = chunks
+		assert self.chunks > 0, "No data found at {}".format(data_path.format(0))
+
+		self.shards = [np.load(data_path.format(chunk), mmap_mode = "r") for chunk in range(self.chunks)]
+		self.offsets = np.cumsum([0] + [len(shard) for shard in self.shards])
+		self.dtype = self.shards[0].dtype
+		self.row_shape = self.shards[0].shape[1:]
+
+	def __len__(self):
+		return int(self.offsets[-1])
+
+	def chunk(self, chunk):
+		"""
+		Returns the memory mapped array of a single chunk.
+		"""
+		return self.shards[chunk]
+
+	def locate(self, indices):
+		"""
+		Maps global row indices to (chunk, row within chunk) pairs.
+		"""
+		chunks = np.searchsorted(self.offsets, indices, side = "right") - 1
+		return chunks, indices - self.offsets[chunks]
+
+	def __getitem__(self, indices):
+		"""
+		Gathers rows by global index. Accepts an integer, a slice or an array of indices, returning a copy.
+		Rows are read in sorted order within each chunk to keep the reads sequential.
+		"""
+		if isinstance(indices, slice):
+			indices = np.arange(*indices.indices(len(self)))
+		scalar = np.ndim(indices) == 0
+		indices = np.atleast_1d(np.asarray(indices, dtype = np.int64))
+		indices = np.where(indices < 0, indices + len(self), indices)
+		assert np.all((indices >= 0) & (indices < len(self))), "Index out of range"
+
+		rows = np.empty((len(indices),) + self.row_shape, dtype = self.dtype)
+		chunks, local = self.locate(indices)
+		for chunk in np.unique(chunks):
+			positions = np.flatnonzero(chunks == chunk)
+			positions = positions[np.argsort(local[positions], kind = "stable")]
+			rows[positions] = self.shards[chunk][local[positions]]
+		return rows[0] if scalar else rows
+
+	def window(self, start, size):
+		"""
+		Returns the global indices of size consecutive rows starting at start, wrapping around the end of the corpus.
+		"""
+		return (start + np.arange(size, dtype = np.int64)) % len(self)
+
+	def sample(self, size, rng):
+		"""
+		Returns the global indices of size distinct rows drawn uniformly from across all chunks.
+		"""
+		return rng.choice(len(self), size = min(size, len(self)), replace = False)
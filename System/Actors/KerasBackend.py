@@ -0,0 +1,221 @@
+import os
+
+import numpy as np
+import tensorflow as tf
+import keras
+
+from keras.models import Sequential
+from keras.layers import Dense, Activation, Dropout, BatchNormalization
+from keras.callbacks import ModelCheckpoint, EarlyStopping, Callback
+
+# The thread pool sizes TensorFlow was configured with, once the first backend has been created.
+configured_threads = None
+
+def configure_threads(intra_op_threads, inter_op_threads):
+	"""
+	Sizes the thread pools of TensorFlow. The pools can only be sized before TensorFlow runs its first operation,
+	so only the first backend created sets them, and a later one asking for different sizes is warned that they are kept.
+	"""
+	global configured_threads
+	threads = (intra_op_threads, inter_op_threads)
+	if configured_threads is None:
+		if intra_op_threads:
+			tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+		if inter_op_threads:
+			tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+		configured_threads = threads
+	elif threads != configured_threads:
+		print("TensorFlow already runs with (intra, inter) op threads {}, ignoring {}".format(configured_threads, threads))
+
+class BestWeights(Callback):
+
+	def __init__(self, monitor = "val_loss"):
+		"""
+		Keeps the weights of the epoch with the lowest monitored loss in memory.
+		Falls back to the training loss if the monitored value is not logged (no validation split).
+		"""
+		super(BestWeights, self).__init__()
+		self.monitor = monitor
+		self.best = None
+		self.weights = None
+
+	def on_train_begin(self, logs = None):
+		self.best = None
+		self.weights = None
+
+	def on_epoch_end(self, epoch, logs = None):
+		logs = logs or {}
+		value = logs.get(self.monitor, logs.get("loss"))
+		if value is not None and (self.best is None or value < self.best):
+			self.best = value
+			self.weights = self.model.get_weights()
+
+class ManagedCheckpoint(Callback):
+
+	def __init__(self, checkpoints, episode, step, monitor = "val_loss"):
+		"""
+		Offers the model of every epoch to a CheckpointManager, which only writes it if it is among the top-k of the step.
+		"""
+		super(ManagedCheckpoint, self).__init__()
+		self.checkpoints = checkpoints
+		self.episode = episode
+		self.step = step
+		self.monitor = monitor
+
+	def on_epoch_end(self, epoch, logs = None):
+		logs = logs or {}
+		value = logs.get(self.monitor, logs.get("loss"))
+		if value is not None:
+			self.checkpoints.offer(self.episode, self.step, epoch + 1, value, self.model.save)
+
+class KerasBackend:
+
+	def __init__(self, agent):
+		"""
+		Runs the model of an Agent with Keras. The model consists of a series of (ReLU, Dropout, BatchNorm) layers.
+		Parameters:
+			Necessary:
+				agent: The Agent whose sizes, dropout, epochs and checkpoints are used.
+		"""
+		self.agent = agent
+		self.model = None
+		self.optimizer_initial = {}
+		configure_threads(agent.intra_op_threads, agent.inter_op_threads)
+		if agent.seed is not None:
+			tf.config.experimental.enable_op_determinism()
+			self.set_seed(agent.seed)
+
+
+	def build(self):
+		"""
+		Builds the model to be used.
+		"""
+		agent = self.agent
+		self.model = Sequential()
+		self.model.add(Dense(agent.units, input_dim = agent.input_size,
+					kernel_initializer = "truncated_normal",
+					bias_initializer = "truncated_normal"))
+		self.model.add(Activation("relu"))
+		self.model.add(Dropout(agent.dropout_prob))
+		self.model.add(BatchNormalization())
+		if agent.layers > 2:
+			for i in range(agent.layers - 2):
+				self.model.add(Dense(agent.units,
+								kernel_initializer='truncated_normal',
+								bias_initializer='truncated_normal'))
+				self.model.add(Activation("relu"))
+				self.model.add(Dropout(agent.dropout_prob))
+				self.model.add(BatchNormalization())
+		self.model.add(Dense(agent.output_size))
+		self.model.add(Activation("relu"))
+
+
+	def compile(self):
+		"""
+		Compiles the model with a MSE loss and an Adam optimizer.
+		"""
+		self.model.compile(optimizer = "adam", loss = "mse")
+		# Values of the variables the optimizer starts with (e.g. its learning rate and iteration count).
+		# Its moments are only created by the first training run, starting at zero.
+		self.optimizer_initial = {id(variable): variable.numpy() for variable in self.optimizer_variables()}
+
+
+	def optimizer_variables(self):
+		variables = self.model.optimizer.variables
+		return variables() if callable(variables) else variables
+
+
+	def reset_optimizer(self):
+		"""
+		Returns the optimizer to the state it was compiled with, so that a training run starts afresh
+		without recompiling the model, which would rebuild the optimizer and retrace the train function.
+		"""
+		for variable in self.optimizer_variables():
+			initial = self.optimizer_initial.get(id(variable))
+			variable.assign(initial if initial is not None else tf.zeros_like(variable))
+
+
+	def dataset(self, X, Y, shuffle = False):
+		"""
+		Returns a batched, prefetched tf.data pipeline over X and Y (arrays or memmaps), reading one batch at a time.
+		Without shuffling, batches are consecutive windows of the arrays. With shuffling, the row indices
+		are shuffled (in a buffer of shuffle_buffer rows, all rows by default) and every batch is gathered.
+		"""
+		agent = self.agent
+		batch_size = agent.batch_size
+
+		def window(start):
+			return (np.asarray(X[start : start + batch_size], dtype = np.float32),
+				np.asarray(Y[start : start + batch_size], dtype = np.float32))
+
+		def gather(indices):
+			indices = np.sort(indices)
+			return np.asarray(X[indices], dtype = np.float32), np.asarray(Y[indices], dtype = np.float32)
+
+		if shuffle:
+			keys = tf.data.Dataset.range(len(X)).shuffle(agent.shuffle_buffer or len(X)).batch(batch_size)
+		else:
+			keys = tf.data.Dataset.range(0, len(X), batch_size)
+		batches = keys.map(lambda key: tuple(tf.numpy_function(gather if shuffle else window, [key],
+								[tf.float32, tf.float32])),
+				num_parallel_calls = tf.data.AUTOTUNE)
+		batches = batches.map(lambda x, y: (tf.ensure_shape(x, [None, X.shape[1]]), tf.ensure_shape(y, [None, Y.shape[1]])))
+		return batches.prefetch(tf.data.AUTOTUNE)
+
+
+	def fit(self, X, Y, save_checkpoints = True):
+		"""
+		Trains the model on X, Y and returns (history, best weights, best loss).
+		The last rows (see Agent.train_rows) are held out for validation as views, without copying X.
+		With the dataset input pipeline the arrays are fed through tf.data (see dataset), otherwise
+		they are handed to Keras directly.
+		If save_checkpoints, the checkpoints are offered to the CheckpointManager of the Agent, or all written
+		to its checkpoint directory if it has none. Stops early after patience epochs without improvement.
+		"""
+		agent = self.agent
+		best = BestWeights()
+		callbacks = [best]
+		if save_checkpoints and agent.checkpoints is not None:
+			callbacks.append(ManagedCheckpoint(agent.checkpoints, *agent.checkpoint_key))
+		elif save_checkpoints:
+			checkpoint_path = os.path.join(agent.checkpoint_dir, "{epoch:02d}-{val_loss:.4f}.hdf5")
+			callbacks.append(ModelCheckpoint(filepath = checkpoint_path, save_best_only = False, verbose = 0))
+		if agent.patience:
+			callbacks.append(EarlyStopping(monitor = "val_loss" if agent.val_split > 0 else "loss",
+						patience = agent.patience, min_delta = agent.min_delta))
+
+		train_rows = agent.train_rows(len(X))
+		X_train, Y_train = X[:train_rows], Y[:train_rows]
+		X_val, Y_val = X[train_rows:], Y[train_rows:]
+		if agent.input_pipeline == "dataset":
+			validation = self.dataset(X_val, Y_val) if len(X_val) else None
+			history = self.model.fit(self.dataset(X_train, Y_train, shuffle = agent.shuffle_buffer != 0),
+					validation_data = validation, epochs = agent.epochs, callbacks = callbacks, verbose = 0)
+		else:
+			validation = (X_val, np.asarray(Y_val, dtype = np.float32)) if len(X_val) else None
+			history = self.model.fit(X_train, np.asarray(Y_train, dtype = np.float32), batch_size = agent.batch_size,
+					validation_data = validation, epochs = agent.epochs, callbacks = callbacks, verbose = 0)
+		return history.history, best.weights, best.best
+
+
+	def set_seed(self, seed):
+		"""
+		Seeds the Python, NumPy and TensorFlow random number generators used by the model.
+		"""
+		keras.utils.set_random_seed(seed)
+
+
+	def get_weights(self):
+		return self.model.get_weights()
+
+
+	def set_weights(self, weights):
+		self.model.set_weights(weights)
+
+
+	def load_weights(self, checkpoint):
+		self.model.load_weights(checkpoint)
+
+
+	def predict(self, X):
+		return self.model.predict(X)
@@ -0,0 +1,146 @@
+import os
+import tempfile
+from argparse import ArgumentParser
+
+import numpy as np
+
+def fold_weights(weights, epsilon = 1e-3):
+	"""
+	Folds the BatchNorm layers of an Agent model into the Dense layer that follows each of them.
+	Parameters:
+		Necessary:
+			weights: The list returned by get_weights() of an Agent model: (kernel, bias, gamma, beta,
+				moving_mean, moving_variance) for every hidden block, then the kernel and bias of the output layer.
+		Optional:
+			epsilon: The BatchNormalization epsilon (Keras default).
+	Returns the (kernel, bias) pairs of a plain Dense -> ReLU network computing the same function.
+	"""
+	assert (len(weights) - 2) % 6 == 0, "Unexpected weights for an Agent model"
+	weights = [np.asarray(weight, dtype = np.float64) for weight in weights]
+	blocks = [weights[idx : idx + 6] for idx in range(0, len(weights) - 2, 6)]
+
+	layers = []
+	scale, shift = None, None
+	for kernel, bias in [block[:2] for block in blocks] + [weights[-2:]]:
+		if scale is not None:
+			# BN(relu(h)) @ W + b == relu(h) @ (scale * W) + (shift @ W + b)
+			kernel, bias = scale.reshape(-1, 1) * kernel, shift.dot(kernel) + bias
+		layers.append((kernel.astype(np.float32), bias.astype(np.float32)))
+		if len(layers) <= len(blocks):
+			gamma, beta, mean, variance = blocks[len(layers) - 1][2:]
+			scale = gamma / np.sqrt(variance + epsilon)
+			shift = beta - mean * scale
+	return layers
+
+def save_folded(layers, path):
+	"""
+	Writes folded (kernel, bias) pairs to an .npz weight file. The file is written under a temporary name
+	and renamed, so that processes exporting the same checkpoint at once (e.g. the workers of Evaluate.py)
+	never read a partial file.
+	"""
+	arrays = {}
+	for idx, (kernel, bias) in enumerate(layers):
+		arrays["kernel_{}".format(idx)] = kernel
+		arrays["bias_{}".format(idx)] = bias
+	fd, partial_path = tempfile.mkstemp(dir = os.path.dirname(os.path.abspath(path)), prefix = ".partial-", suffix = ".npz")
+	with os.fdopen(fd, "wb") as f:
+		np.savez(f, **arrays)
+	os.replace(partial_path, path)
+
+def load_folded(path):
+	"""
+	Reads folded (kernel, bias) pairs from an .npz weight file.
+	"""
+	with np.load(path) as arrays:
+		return [(arrays["kernel_{}".format(idx)], arrays["bias_{}".format(idx)])
+			for idx in range(len(arrays.files) // 2)]
+
+def exported_path(checkpoint):
+	"""
+	Returns the path of the .npz weight file exported next to a checkpoint. CheckpointManager removes it
+	together with its checkpoint.
+	"""
+	return os.path.splitext(checkpoint)[0] + ".npz"
+
+def export_checkpoint(checkpoint, path = None):
+	"""
+	Exports a trained Agent checkpoint (.hdf5) to a folded .npz weight file next to it (or at path).
+	Keras is only imported here, so inference itself never needs it.
+	"""
+	from keras.models import load_model
+	path = path or exported_path(checkpoint)
+	save_folded(fold_weights(load_model(checkpoint).get_weights()), path)
+	return path
+
+class NumpyBackend:
+
+	def __init__(self, agent, batch_size = 65536):
+		"""
+		A pure NumPy, float32 backend for a predict mode Agent, running the BatchNorm folded network.
+		Parameters:
+			Necessary:
+				agent: The Agent whose output size is used.
+			Optional:
+				Batch Size: Number of rows multiplied at a time, bounding the memory used by predict
+		"""
+		assert agent.mode == "predict", "The numpy backend can only predict"
+		self.agent = agent
+		self.batch_size = batch_size
+		self.weights = None
+
+	def build(self):
+		pass
+
+	def compile(self):
+		pass
+
+	def fit(self, X, Y, save_checkpoints = True):
+		raise NotImplementedError("The numpy backend can only predict")
+
+	def get_weights(self):
+		raise NotImplementedError("The numpy backend only keeps folded weights")
+
+	def set_weights(self, weights):
+		"""
+		Sets the weights from the get_weights() list of a Keras Agent model, folding the BatchNorm layers.
+		"""
+		self.weights = fold_weights(weights)
+
+	def load_weights(self, checkpoint):
+		"""
+		Loads a checkpoint, preferring an exported .npz next to it and exporting one if there is none,
+		or if it is older than the checkpoint (which has since been overwritten).
+		"""
+		exported = exported_path(checkpoint)
+		if not os.path.exists(exported) or os.path.getmtime(exported) < os.path.getmtime(checkpoint):
+			export_checkpoint(checkpoint, exported)
+		self.weights = load_folded(exported)
+
+	def predict(self, X):
+		"""
+		Given a set of data points, this function returns the corresponding predictions.
+		"""
+		assert self.weights is not None, "No weights loaded"
+		predictions = np.empty((len(X), self.agent.output_size), dtype = np.float32)
+		for offset in range(0, len(X), self.batch_size):
+			hidden = np.asarray(X[offset : offset + self.batch_size], dtype = np.float32)
+			for kernel, bias in self.weights:
+				hidden = np.dot(hidden, kernel)
+				hidden += bias
+				np.maximum(hidden, 0, out = hidden)
+			predictions[offset : offset + len(hidden)] = hidden
+		return predictions
+
+def get_paths_from_command_line():
+	parser = ArgumentParser()
+	parser.add_argument("src", help = "Agent checkpoint (.hdf5)")
+	parser.add_argument("dest", nargs = "?", default = None, help = "Weight file to write (Default: next to src)")
+	args = parser.parse_args()
+	return args.src, args.dest
+
+def main():
+	src, dest = get_paths_from_command_line()
+	print(export_checkpoint(src, dest))
+
+if __name__ == "__main__":
+	main()
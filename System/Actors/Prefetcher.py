@@ -0,0 +1,48 @@
+from time import time
+from concurrent.futures import ThreadPoolExecutor
+
+class ChunkPrefetcher:
+
+	def __init__(self, data_manager):
+		"""
+		Reads and decodes the data of the next episode on a background thread while the current episode is played.
+		At most one episode is read ahead, so no more than two episodes of data are held in memory.
+		Parameters:
+			Necessary:
+				data_manager: DataManager whose read is run in the background.
+		"""
+		self.data_manager = data_manager
+		self.executor = ThreadPoolExecutor(max_workers = 1)
+		self.pending = None
+		self.stats = {}
+
+	def timed_read(self, episode):
+		start = time()
+		data = self.data_manager.read(episode)
+		return data, time() - start
+
+	def prefetch(self, episode):
+		"""
+		Starts reading an episode in the background, after waiting for (and dropping) any other read ahead.
+		"""
+		if self.pending is not None and self.pending[0] != episode:
+			self.pending[1].result()
+			self.pending = None
+		if self.pending is None:
+			self.pending = (episode, self.executor.submit(self.timed_read, episode))
+
+	def get(self, episode):
+		"""
+		Returns the data of an episode, read ahead if it was prefetched and read now otherwise.
+		Records the time the read took (hidden if prefetched) and the time spent waiting for it in stats.
+		"""
+		start = time()
+		self.prefetch(episode)
+		data, read_seconds = self.pending[1].result()
+		self.pending = None
+		self.stats = {"prefetch_read_seconds": read_seconds, "prefetch_wait_seconds": time() - start}
+		return data
+
+	def close(self):
+		self.executor.shutdown(wait = True)
+		self.pending = None
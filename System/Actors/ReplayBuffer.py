@@ -0,0 +1,160 @@
+import os
+import json
+import numpy as np
+
+class ReplayBuffer:
+
+	def __init__(self, input_size, output_size, capacity = None, memory_mb = None, path = None,
+			prioritised = False, alpha = 0.6, rng = None):
+		"""
+		A fixed capacity ring buffer of (X, Y) training samples, kept across steps and episodes.
+		X is binary (one hot hand and bidding history) and stored bit packed, Y (normalised IMP) as float16,
+		so that a row of the default 88 inputs and 36 outputs takes 11 + 72 (+ 4 for its priority) bytes.
+		Parameters:
+			Necessary:
+				Input Size
+				Output Size
+			Optional:
+				capacity: Number of rows kept (the oldest are overwritten first)
+				memory_mb: Memory budget the capacity is derived from if capacity is not given
+				path: Directory for memmap backing (Default: in memory). An existing buffer there is reopened.
+				prioritised: Sample rows proportionally to priority ** alpha instead of uniformly
+				alpha: Prioritisation exponent (0 is uniform)
+				rng: numpy Generator used for sampling
+		"""
+		self.input_size = input_size
+		self.output_size = output_size
+		self.packed_size = (input_size + 7) // 8
+		self.prioritised = prioritised
+		self.alpha = alpha
+		self.rng = rng if rng is not None else np.random.default_rng()
+		self.path = path
+		self.position = 0
+		self.size = 0
+		self.max_priority = 1.0
+
+		if capacity is None:
+			assert memory_mb is not None, "Either capacity or memory_mb is needed"
+			capacity = int(memory_mb * 2 ** 20 // self.row_bytes())
+		assert capacity > 0
+		self.capacity = capacity
+
+		shapes = {"X": ((capacity, self.packed_size), np.uint8), "Y": ((capacity, output_size), np.float16),
+			"priorities": ((capacity,), np.float32)}
+		if path is None:
+			arrays = {name: np.zeros(shape, dtype = dtype) for name, (shape, dtype) in shapes.items()}
+		else:
+			arrays = self.open_memmaps(shapes)
+		self.X = arrays["X"]
+		self.Y = arrays["Y"]
+		self.priorities = arrays["priorities"]
+
+	def row_bytes(self):
+		return self.packed_size + 2 * self.output_size + 4
+
+	def open_memmaps(self, shapes):
+		"""
+		Opens the memmap backed arrays, reusing the ones (and the position) of an existing buffer of the same shape.
+		"""
+		if not os.path.exists(self.path):
+			os.makedirs(self.path)
+		meta = self.read_meta()
+		reuse = meta is not None and meta["capacity"] == shapes["X"][0][0] and meta["input_size"] == self.input_size \
+			and meta["output_size"] == self.output_size
+		arrays = {}
+		for name, (shape, dtype) in shapes.items():
+			arrays[name] = np.lib.format.open_memmap(os.path.join(self.path, "{}.npy".format(name)),
+							mode = "r+" if reuse else "w+", dtype = dtype, shape = shape)
+		if reuse:
+			self.position, self.size, self.max_priority = meta["position"], meta["size"], meta["max_priority"]
+		return arrays
+
+	def read_meta(self):
+		meta_path = os.path.join(self.path, "meta.json")
+		if not os.path.exists(meta_path):
+			return None
+		with open(meta_path) as f:
+			return json.load(f)
+
+	def flush(self):
+		"""
+		Flushes a memmap backed buffer and records its position, so it can be reopened.
+		"""
+		if self.path is None:
+			return
+		for array in [self.X, self.Y, self.priorities]:
+			array.flush()
+		meta = {"capacity": self.capacity, "input_size": self.input_size, "output_size": self.output_size,
+			"position": self.position, "size": self.size, "max_priority": self.max_priority}
+		with open(os.path.join(self.path, "meta.json.partial"), "w") as f:
+			json.dump(meta, f)
+		os.replace(os.path.join(self.path, "meta.json.partial"), os.path.join(self.path, "meta.json"))
+
+	def __len__(self):
+		return self.size
+
+	def state(self):
+		"""
+		Returns the position, size, highest priority and sampling RNG state of the buffer (see restore_state).
+		"""
+		return {"position": self.position, "size": self.size, "max_priority": self.max_priority,
+			"rng": self.rng.bit_generator.state}
+
+	def restore_state(self, state):
+		self.position, self.size, self.max_priority = state["position"], state["size"], state["max_priority"]
+		self.rng.bit_generator.state = state["rng"]
+
+	def add(self, X, Y, priorities = None):
+		"""
+		Adds rows, overwriting the oldest rows once the buffer is full.
+		New rows get the highest priority seen so far unless priorities are given.
+		"""
+		X = np.asarray(X)[-self.capacity:]
+		Y = np.asarray(Y)[-self.capacity:]
+		count = len(X)
+		if count == 0:
+			return
+		if priorities is None:
+			priorities = np.full(count, self.max_priority, dtype = np.float32)
+		else:
+			priorities = np.asarray(priorities, dtype = np.float32)[-self.capacity:]
+			self.max_priority = max(self.max_priority, float(priorities.max()))
+
+		indices = (self.position + np.arange(count)) % self.capacity
+		self.X[indices] = np.packbits(X.astype(np.bool_), axis = 1)
+		self.Y[indices] = Y
+		self.priorities[indices] = priorities
+		self.position = (self.position + count) % self.capacity
+		self.size = min(self.size + count, self.capacity)
+
+	def sample_indices(self, size):
+		"""
+		Draws size row indices, uniformly or proportionally to priority ** alpha.
+		"""
+		assert self.size > 0, "The replay buffer is empty"
+		if not self.prioritised:
+			return self.rng.integers(0, self.size, size = size)
+		weights = self.priorities[:self.size].astype(np.float64)
+		if self.alpha != 1:
+			weights = weights ** self.alpha
+		cumulative = np.cumsum(weights)
+		indices = np.searchsorted(cumulative, self.rng.random(size) * cumulative[-1], side = "right")
+		return np.minimum(indices, self.size - 1)
+
+	def sample(self, size):
+		"""
+		Returns (X, Y, indices) of size sampled rows, with X and Y as float32 ready for training.
+		"""
+		indices = np.sort(self.sample_indices(size))
+		X = np.unpackbits(self.X[indices], axis = 1, count = self.input_size).astype(np.float32)
+		Y = self.Y[indices].astype(np.float32)
+		return X, Y, indices
+
+	def update_priorities(self, indices, priorities):
+		"""
+		Sets the priorities of sampled rows, e.g. to their prediction error after training.
+		"""
+		priorities = np.asarray(priorities, dtype = np.float32)
+		self.priorities[indices] = priorities
+		if len(priorities):
+			self.max_priority = max(self.max_priority, float(priorities.max()))
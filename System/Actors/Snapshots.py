@@ -0,0 +1,88 @@
+import os
+import json
+import shutil
+import tempfile
+import numpy as np
+
+class SnapshotManager:
+
+	def __init__(self, root):
+		"""
+		Keeps an atomic snapshot of the state of the latest step of a training run, so that an interrupted run
+		resumes at the exact step it stopped after. A snapshot is a directory of .npy arrays and a state.json,
+		written in full before snapshot.json is atomically pointed at it. Only the latest snapshot is kept.
+		Parameters:
+			Necessary:
+				root: Directory holding the snapshots and snapshot.json.
+		"""
+		self.root = root
+		self.pointer_path = os.path.join(root, "snapshot.json")
+		if not os.path.exists(root):
+			os.makedirs(root)
+
+	def write_file(self, path, write):
+		"""
+		Writes a file with write(f) and flushes it to disk.
+		"""
+		with open(path, "wb") as f:
+			write(f)
+			f.flush()
+			os.fsync(f.fileno())
+
+	def save(self, state, arrays):
+		"""
+		Saves a snapshot.
+		Parameters:
+			Necessary:
+				state: JSON serialisable dict, with the episode and step the run resumes at.
+				arrays: Dict of the numpy arrays of the snapshot.
+		Returns the bytes written.
+		"""
+		name = "{}-{}".format(state["episode"], state["step"])
+		path = os.path.join(self.root, name)
+		partial_path = path + ".partial"
+		for stale in [partial_path, path]:
+			if os.path.exists(stale):
+				shutil.rmtree(stale)
+		os.makedirs(partial_path)
+		for key, array in arrays.items():
+			self.write_file(os.path.join(partial_path, "{}.npy".format(key)), lambda f: np.save(f, array))
+		self.write_file(os.path.join(partial_path, "state.json"), lambda f: f.write(json.dumps(state).encode()))
+		written = sum(os.path.getsize(os.path.join(partial_path, entry)) for entry in os.listdir(partial_path))
+		os.replace(partial_path, path)
+
+		fd, pointer = tempfile.mkstemp(dir = self.root, prefix = ".snapshot-", suffix = ".json")
+		with os.fdopen(fd, "w") as f:
+			json.dump({"snapshot": name, "arrays": sorted(arrays)}, f)
+			f.flush()
+			os.fsync(f.fileno())
+		os.replace(pointer, self.pointer_path)
+
+		for entry in os.listdir(self.root):
+			if entry != name and os.path.isdir(os.path.join(self.root, entry)):
+				shutil.rmtree(os.path.join(self.root, entry))
+		return written
+
+	def pointer(self):
+		if not os.path.exists(self.pointer_path):
+			return None
+		with open(self.pointer_path) as f:
+			return json.load(f)
+
+	def state(self):
+		"""
+		Returns the state of the latest snapshot, or None if there is none.
+		"""
+		pointer = self.pointer()
+		if pointer is None:
+			return None
+		with open(os.path.join(self.root, pointer["snapshot"], "state.json")) as f:
+			return json.load(f)
+
+	def arrays(self):
+		"""
+		Returns the arrays of the latest snapshot.
+		"""
+		pointer = self.pointer()
+		return {key: np.load(os.path.join(self.root, pointer["snapshot"], "{}.npy".format(key)))
+			for key in pointer["arrays"]}
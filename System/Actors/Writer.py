@@ -0,0 +1,69 @@
+import os
+import threading
+import numpy as np
+from queue import Queue
+
+class AsyncWriter:
+
+	def __init__(self, max_pending = 4):
+		"""
+		Saves arrays to disk on a background thread, keeping the writes off the critical path.
+		Parameters:
+			Optional:
+				max_pending: Number of arrays that may wait to be written before save blocks.
+		"""
+		self.queue = Queue(maxsize = max_pending)
+		self.error = None
+		self.thread = threading.Thread(target = self.run)
+		self.thread.daemon = True
+		self.thread.start()
+
+	def run(self):
+		"""
+		Writes queued arrays until a None sentinel is received.
+		"""
+		while True:
+			item = self.queue.get()
+			try:
+				if item is None:
+					return
+				path, array = item
+				if self.error is None:
+					directory = os.path.dirname(path)
+					if directory and not os.path.exists(directory):
+						os.makedirs(directory)
+					np.save(path, array)
+			except Exception as error:
+				self.error = error
+			finally:
+				self.queue.task_done()
+
+	def check(self):
+		"""
+		Re-raises the first error hit by the background thread.
+		"""
+		if self.error is not None:
+			error, self.error = self.error, None
+			raise error
+
+	def save(self, path, array):
+		"""
+		Queues an array to be saved to path. The array must not be modified in place afterwards.
+		"""
+		self.check()
+		self.queue.put((path, array))
+
+	def flush(self):
+		"""
+		Blocks until every queued array has been written.
+		"""
+		self.queue.join()
+		self.check()
+
+	def close(self):
+		"""
+		Writes the remaining arrays and stops the background thread.
+		"""
+		self.queue.put(None)
+		self.thread.join()
+		self.check()
@@ -1,3 +1,10 @@
-from Agent import Agent
-from Bandit import EpsilonBandit
-from DataManager import DataManager
+from .Agent import Agent
+from .Bandit import EpsilonBandit
+from .DataManager import DataManager
+from .Writer import AsyncWriter
+from .Checkpoints import CheckpointManager
+from .Dataset import ShardedDataset
+from .ReplayBuffer import ReplayBuffer
+from .Prefetcher import ChunkPrefetcher
+from .Snapshots import SnapshotManager
+from .Backends import backends, register_backend, get_backend
@@ -0,0 +1,113 @@
+import os
+import json
+import multiprocessing
+from time import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from System import System
+from Actors import *
+
+# State of an evaluation worker, set up once per process by init_worker.
+worker = {}
+
+def score_bids(IMP, bids):
+	"""
+	Gathers the (normalised) IMP of the bid made for every deal.
+	"""
+	return IMP[np.arange(len(bids)), np.asarray(bids, dtype = np.int64)]
+
+def init_worker(config):
+	"""
+	Builds the predictor and loads its checkpoint once per worker process.
+	"""
+	predictor = Agent(config["input_size"], config["layers"], config["units"], config["output_size"], "predict",
+			backend = config["predictor"])
+	checkpoints = CheckpointManager(config["checkpoint_root"], step_dir = config["step_dir"])
+	predictor.set_checkpoints(checkpoints, *config["checkpoint_key"])
+	predictor.setup(None, config["checkpoint_root"])
+	worker["predictor"] = predictor
+	worker["data_manager"] = DataManager(config["data_path"], chunks = config["chunks"])
+	worker["config"] = config
+
+def evaluate_chunk(chunk):
+	"""
+	Bids every deal of a chunk to completion without persisting any training data.
+	A deal scores the IMP of the bid that completes its sequence, or of its last bid after max_steps.
+	"""
+	config = worker["config"]
+	predictor = worker["predictor"]
+	data_manager = worker["data_manager"]
+	bandit = EpsilonBandit(config["epsilon"], rng = np.random.default_rng([config["seed"], chunk]))
+
+	start = time()
+	data_manager.load(chunk)
+	deals = len(data_manager.active)
+	score = 0.0
+	for step in range(config["max_steps"]):
+		if len(data_manager.active) == 0:
+			break
+		data_manager.pre_step(step)
+		predictions = predictor.predict_model(data_manager.X)
+		bids = bandit.decision(predictions, data_manager.PrevBid)
+		IMP = score_bids(data_manager.IMP, bids)
+		if step < config["max_steps"] - 1:
+			IMP = IMP[(bids == 0) | (bids == 35)]
+		score += float(np.sum(IMP))
+		data_manager.advance(bids)
+
+	return {"chunk": chunk, "deals": deals, "score": score, "imp_per_deal": score / deals * 48 - 24,
+		"seconds": time() - start}
+
+def evaluate(config, chunks, workers):
+	"""
+	Evaluates the chunks on a process pool and returns the per-chunk and the aggregate scores.
+	"""
+	context = multiprocessing.get_context("spawn")
+	with ProcessPoolExecutor(max_workers = workers, mp_context = context,
+				initializer = init_worker, initargs = (config,)) as pool:
+		results = list(pool.map(evaluate_chunk, chunks))
+
+	deals = sum(result["deals"] for result in results)
+	score = sum(result["score"] for result in results)
+	aggregate = {"chunks": len(results), "deals": deals, "score": score,
+		"imp_per_deal": score / deals * 48 - 24 if deals else None}
+	return results, aggregate
+
+def main():
+	system = System()
+	system.parser.add_argument("--workers", help = "Number of Evaluation Worker Processes",
+				type = int, default = os.cpu_count())
+	system.parser.add_argument("--eval_chunks", help = "Chunks to Evaluate (Default: All Chunks)",
+				type = int, nargs = "+", default = None)
+	system.parser.add_argument("--checkpoint_key", help = "Episode and Step of the Checkpoint to Evaluate (Default: Latest)",
+				type = int, nargs = 2, default = None)
+	system.parser.add_argument("--results_file", help = "JSON File to Write the Scores to", default = None)
+	system.setup_arguments()
+	system.setup_checkpoints()
+	args = system.args
+
+	checkpoint_key = tuple(args.checkpoint_key) if args.checkpoint_key else system.checkpoints.latest()
+	assert checkpoint_key is not None, "No checkpoint found in {}".format(system.checkpoints.root)
+	data_path = os.path.join(args.base_dir, args.raw_data_path)
+	chunks = args.eval_chunks if args.eval_chunks is not None else list(range(ShardedDataset(data_path, args.chunks).chunks))
+
+	# The bandit of an unseeded evaluation is seeded by 0, so that evaluations of checkpoints are comparable.
+	config = {"input_size": args.input_size, "layers": args.layers, "units": args.units,
+		"output_size": args.output_size, "checkpoint_root": system.checkpoints.root,
+		"step_dir": system.checkpoints.step_dir, "checkpoint_key": checkpoint_key,
+		"data_path": data_path, "chunks": args.chunks, "max_steps": args.max_steps,
+		"epsilon": args.epsilon, "seed": args.seed if args.seed is not None else 0, "predictor": args.predictor}
+	results, aggregate = evaluate(config, chunks, min(args.workers, len(chunks)))
+
+	for result in results:
+		print("Chunk {chunk}: {deals} deals, {imp_per_deal:.3f} IMP/deal in {seconds:.1f}s".format(**result))
+	print("Checkpoint {}-{}: {} deals, {:.3f} IMP/deal".format(checkpoint_key[0], checkpoint_key[1],
+		aggregate["deals"], aggregate["imp_per_deal"]))
+	if args.results_file:
+		with open(args.results_file, "w") as f:
+			json.dump({"checkpoint_key": checkpoint_key, "chunks": results, "aggregate": aggregate}, f, indent = 4)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,83 @@
+import json
+import asyncio
+from time import time
+from argparse import ArgumentParser
+
+import numpy as np
+
+def random_request(rng):
+	"""
+	Returns a random hand (13 card indices) and a random increasing bidding history.
+	"""
+	hand = rng.permutation(52)[:13]
+	history = np.sort(rng.choice(np.arange(1, 36), size = rng.integers(0, 6), replace = False))
+	return {"hand": hand.tolist(), "history": history.tolist()}
+
+async def request(reader, writer, method, path, body = None):
+	"""
+	Sends one HTTP/1.1 request on a keep alive connection and returns its status and json response.
+	"""
+	payload = json.dumps(body).encode() if body is not None else b""
+	writer.write("{} {} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\nContent-Length: {}\r\n\r\n".format(
+		method, path, len(payload)).encode() + payload)
+	await writer.drain()
+	status = int((await reader.readline()).decode().split()[1])
+	length = 0
+	while True:
+		header = await reader.readline()
+		if header in [b"\r\n", b"\n", b""]:
+			break
+		name, _, value = header.decode().partition(":")
+		if name.strip().lower() == "content-length":
+			length = int(value)
+	return status, json.loads((await reader.readexactly(length)).decode())
+
+async def connect(host, port, socket_path):
+	if socket_path:
+		return await asyncio.open_unix_connection(socket_path)
+	return await asyncio.open_connection(host, port)
+
+async def table(args, seed, latencies):
+	"""
+	Plays one table: sends requests one after another on its own connection.
+	"""
+	rng = np.random.default_rng(seed)
+	reader, writer = await connect(args.host, args.port, args.socket)
+	for _ in range(args.requests):
+		start = time()
+		status, response = await request(reader, writer, "POST", "/bid", random_request(rng))
+		assert status == 200, response
+		latencies.append(time() - start)
+	writer.close()
+
+async def load_test(args):
+	latencies = []
+	start = time()
+	await asyncio.gather(*[table(args, [args.seed, idx], latencies) for idx in range(args.tables)])
+	elapsed = time() - start
+
+	latencies = np.array(latencies) * 1000
+	print("{} requests from {} tables in {:.2f}s: {:.0f} requests/s".format(len(latencies), args.tables,
+		elapsed, len(latencies) / elapsed))
+	print("Client latency: p50 {:.2f}ms p99 {:.2f}ms".format(np.percentile(latencies, 50), np.percentile(latencies, 99)))
+
+	reader, writer = await connect(args.host, args.port, args.socket)
+	_, stats = await request(reader, writer, "GET", "/metrics")
+	writer.close()
+	print("Service: {}".format(json.dumps(stats)))
+
+def get_arguments_from_command_line():
+	parser = ArgumentParser()
+	parser.add_argument("--host", default = "127.0.0.1")
+	parser.add_argument("--port", type = int, default = 8080)
+	parser.add_argument("--socket", default = None, help = "Unix socket of the service instead of TCP")
+	parser.add_argument("--tables", type = int, default = 256, help = "Concurrent connections")
+	parser.add_argument("--requests", type = int, default = 100, help = "Requests per table")
+	parser.add_argument("--seed", type = int, default = 0)
+	return parser.parse_args()
+
+def main():
+	asyncio.run(load_test(get_arguments_from_command_line()))
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,126 @@
+import os
+import json
+import signal
+import cProfile
+from time import time
+from contextlib import contextmanager
+from collections import defaultdict
+
+class SamplingProfiler:
+
+	def __init__(self, interval = 0.005):
+		"""
+		Samples the Python stack of the main thread every interval seconds of CPU time while enabled.
+		Samples are kept as collapsed stacks ("outer;inner;innermost" -> count), as used by flame graph tools.
+		"""
+		self.interval = interval
+		self.counts = defaultdict(int)
+		self.previous = None
+
+	def sample(self, signum, frame):
+		stack = []
+		while frame is not None:
+			stack.append("{}:{}".format(os.path.basename(frame.f_code.co_filename), frame.f_code.co_name))
+			frame = frame.f_back
+		self.counts[";".join(reversed(stack))] += 1
+
+	def enable(self):
+		self.previous = signal.signal(signal.SIGPROF, self.sample)
+		signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+	def disable(self):
+		signal.setitimer(signal.ITIMER_PROF, 0, 0)
+		signal.signal(signal.SIGPROF, self.previous or signal.SIG_DFL)
+
+	def dump(self, path):
+		with open(path, "w") as f:
+			for stack, count in sorted(self.counts.items(), key = lambda item: -item[1]):
+				f.write("{} {}\n".format(stack, count))
+
+class Metrics:
+
+	def __init__(self, path = None, profile = None, profile_dir = None, profile_phases = None):
+		"""
+		Times the phases of every step and appends one JSON record per step to a metrics file.
+		Parameters:
+			Optional:
+				path: JSONL file to append the records to (Default: records are not written).
+				profile: None, "cprofile" or "sample" to profile the phases.
+				profile_dir: Directory the profiles are written to, one file per phase.
+				profile_phases: Names of the phases to profile (Default: all phases).
+		"""
+		self.path = path
+		self.profile = profile
+		self.profile_dir = profile_dir
+		self.profile_phases = profile_phases
+		self.profilers = {}
+		self.timings = defaultdict(float)
+		self.annotations = {}
+		self.start = time()
+		assert profile in [None, "cprofile", "sample"]
+
+		for directory in [os.path.dirname(path) if path else None, profile_dir if profile else None]:
+			if directory and not os.path.exists(directory):
+				os.makedirs(directory)
+
+	def profiler(self, name):
+		"""
+		Returns the profiler of a phase, or None if the phase is not profiled.
+		"""
+		if self.profile is None or (self.profile_phases and name not in self.profile_phases):
+			return None
+		if name not in self.profilers:
+			self.profilers[name] = cProfile.Profile() if self.profile == "cprofile" else SamplingProfiler()
+		return self.profilers[name]
+
+	@contextmanager
+	def phase(self, name):
+		"""
+		Times (and optionally profiles) the enclosed block, adding it to the timings of the current step.
+		"""
+		profiler = self.profiler(name)
+		if profiler is not None:
+			profiler.enable()
+		start = time()
+		try:
+			yield
+		finally:
+			self.timings[name] += time() - start
+			if profiler is not None:
+				profiler.disable()
+
+	def annotate(self, **fields):
+		"""
+		Adds fields to the next record, e.g. times measured off the main thread.
+		"""
+		self.annotations.update(fields)
+
+	def record(self, **fields):
+		"""
+		Writes the timings since the last record together with fields, and starts timing a new step.
+		deals_per_second is derived from an active_deals field.
+		"""
+		elapsed = time() - self.start
+		record = dict(self.annotations, **fields)
+		record["seconds"] = elapsed
+		record["phases"] = dict(self.timings)
+		if "active_deals" in fields:
+			record["deals_per_second"] = fields["active_deals"] / max(elapsed, 1e-9)
+		if self.path:
+			with open(self.path, "a") as f:
+				f.write(json.dumps(record) + "\n")
+		self.timings = defaultdict(float)
+		self.annotations = {}
+		self.start = time()
+		return record
+
+	def close(self):
+		"""
+		Writes the profiles of the profiled phases.
+		"""
+		for name, profiler in self.profilers.items():
+			if self.profile == "cprofile":
+				profiler.dump_stats(os.path.join(self.profile_dir, "{}.prof".format(name)))
+			else:
+				profiler.dump(os.path.join(self.profile_dir, "{}.txt".format(name)))
+		self.profilers = {}
@@ -0,0 +1,241 @@
+import os
+import json
+import asyncio
+from time import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from System import System
+from Actors import *
+
+# Names of the 36 bids: pass, then 1C 1D 1H 1S 1NT ... 7NT (trumps in the order of the bid vector).
+bid_names = ["Pass"] + ["{}{}".format(level, strain) for level in range(1, 8) for strain in ["C", "D", "H", "S", "NT"]]
+
+class BidService:
+
+	def __init__(self, predictor, max_batch = 4096, max_latency = 0.002, input_size = 88,
+			hand_vector_size = 52, window = 100000):
+		"""
+		Recommends greedy legal bids, grouping concurrent requests into one predict_model call.
+		A batch is predicted as soon as it holds max_batch requests, or max_latency seconds after its first request.
+		Parameters:
+			Necessary:
+				predictor: A predict mode Agent
+			Optional:
+				max_batch: Largest number of requests predicted together
+				max_latency: Longest time in seconds a request waits for its batch to fill
+				input_size, hand_vector_size: As for the DataManager
+				window: Number of latest requests and batches the metrics are computed over
+		"""
+		self.predictor = predictor
+		self.bandit = EpsilonBandit(0)
+		self.max_batch = max_batch
+		self.max_latency = max_latency
+		self.input_size = input_size
+		self.hand_vector_size = hand_vector_size
+		self.queue = None
+		self.executor = ThreadPoolExecutor(max_workers = 1)
+		self.latencies = deque(maxlen = window)
+		self.batch_sizes = deque(maxlen = window)
+		self.requests = 0
+		self.batches = 0
+
+	def encode(self, hand, history):
+		"""
+		Returns the model input and the previous bid of a request.
+		Parameters:
+			hand: The 13 card indices (13 * suit + rank - 2) of the N or S hand, or its 52 dimensional one hot vector
+			history: The bids made so far (indices into the bid vector, 0 is pass)
+		"""
+		x = np.zeros(self.input_size, dtype = np.float32)
+		hand = np.asarray(hand, dtype = np.int64)
+		if len(hand) == self.hand_vector_size:
+			assert np.all((hand == 0) | (hand == 1)) and hand.sum() == 13, "A hand vector must be one hot with 13 cards"
+			x[:self.hand_vector_size] = hand
+		else:
+			assert len(hand) == 13 and len(np.unique(hand)) == 13, "A hand must be 13 distinct cards"
+			assert hand.min() >= 0 and hand.max() < self.hand_vector_size, "Cards are indexed 0 to 51"
+			x[hand] = 1
+		history = np.asarray(history, dtype = np.int64)
+		assert np.all((history >= 0) & (history < self.input_size - self.hand_vector_size)), "Unknown bid in history"
+		x[self.hand_vector_size + history] = 1
+		prev_bid = int(history.max()) if len(history) and history.max() > 0 else -1
+		return x, prev_bid
+
+	async def recommend(self, hand, history):
+		"""
+		Queues a request for the next batch and returns its recommended bid.
+		"""
+		return await self.submit(*self.encode(hand, history))
+
+	async def submit(self, x, prev_bid):
+		"""
+		Queues an encoded request for the next batch and returns its recommended bid.
+		Raises the error of the model if its batch could not be predicted.
+		"""
+		future = asyncio.get_running_loop().create_future()
+		await self.queue.put((x, prev_bid, future, time()))
+		return await future
+
+	async def batcher(self):
+		"""
+		Collects requests into batches and predicts them one batch at a time on a worker thread,
+		so that the next batch fills while the current one is predicted.
+		"""
+		loop = asyncio.get_running_loop()
+		while True:
+			batch = [await self.queue.get()]
+			deadline = loop.time() + self.max_latency
+			while len(batch) < self.max_batch:
+				if not self.queue.empty():
+					batch.append(self.queue.get_nowait())
+					continue
+				timeout = deadline - loop.time()
+				if timeout <= 0:
+					break
+				# Waits for the next request until the first request of the batch has waited max_latency,
+				# so that a batch is predicted as soon as it is full.
+				try:
+					batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+				except asyncio.TimeoutError:
+					break
+
+			X = np.stack([request[0] for request in batch])
+			prev_bid = np.array([request[1] for request in batch])
+			try:
+				predictions = await loop.run_in_executor(self.executor, self.predictor.predict_model, X)
+				bids = self.bandit.greedy(np.asarray(predictions), prev_bid)
+			except Exception as error:
+				for request in batch:
+					if not request[2].done():
+						request[2].set_exception(error)
+				continue
+
+			end = time()
+			for (x, _, future, start), bid in zip(batch, bids):
+				if not future.done():
+					future.set_result(int(bid))
+				self.latencies.append(end - start)
+			self.batch_sizes.append(len(batch))
+			self.requests += len(batch)
+			self.batches += 1
+
+	def stats(self):
+		"""
+		Returns the request and batch counts and the p50/p99 latency and batch size over the window.
+		"""
+		stats = {"requests": self.requests, "batches": self.batches}
+		if self.latencies:
+			latencies = np.array(self.latencies) * 1000
+			batch_sizes = np.array(self.batch_sizes)
+			stats.update({"latency_ms_p50": float(np.percentile(latencies, 50)),
+				"latency_ms_p99": float(np.percentile(latencies, 99)),
+				"batch_size_mean": float(batch_sizes.mean()),
+				"batch_size_p50": float(np.percentile(batch_sizes, 50)),
+				"batch_size_p99": float(np.percentile(batch_sizes, 99))})
+		return stats
+
+	async def respond(self, method, path, body):
+		"""
+		Routes a request: POST /bid with {"hand": [...], "history": [...]}, or GET /metrics.
+		Returns (status, json response): 400 for a malformed request, 500 if the model failed to predict it.
+		"""
+		if method == "GET" and path == "/metrics":
+			return 200, self.stats()
+		if method == "POST" and path == "/bid":
+			try:
+				request = json.loads(body.decode() or "{}")
+				x, prev_bid = self.encode(request["hand"], request.get("history", []))
+			except (ValueError, KeyError, TypeError, AssertionError) as error:
+				return 400, {"error": "{}: {}".format(type(error).__name__, error)}
+			try:
+				bid = await self.submit(x, prev_bid)
+			except Exception as error:
+				return 500, {"error": "{}: {}".format(type(error).__name__, error)}
+			return 200, {"bid": bid, "name": bid_names[bid]}
+		return 404, {"error": "Unknown endpoint {} {}".format(method, path)}
+
+	async def handle(self, reader, writer):
+		"""
+		Serves the HTTP/1.1 requests of one (keep alive) connection.
+		"""
+		try:
+			while True:
+				line = await reader.readline()
+				if not line.strip():
+					break
+				method, path = line.decode().split()[:2]
+				headers = {}
+				while True:
+					header = await reader.readline()
+					if header in [b"\r\n", b"\n", b""]:
+						break
+					name, _, value = header.decode().partition(":")
+					headers[name.strip().lower()] = value.strip()
+				body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+				status, response = await self.respond(method, path, body)
+				payload = json.dumps(response).encode()
+				writer.write("HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\n\r\n".format(
+					status, {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error"}[status], len(payload)).encode() + payload)
+				await writer.drain()
+				if headers.get("connection", "").lower() == "close":
+					break
+		except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+			pass
+		finally:
+			writer.close()
+
+	async def serve(self, host = "127.0.0.1", port = 8080, socket_path = None):
+		"""
+		Serves over a unix socket if socket_path is given, and over TCP otherwise.
+		"""
+		self.queue = asyncio.Queue()
+		batcher = asyncio.ensure_future(self.batcher())
+		if socket_path:
+			if os.path.exists(socket_path):
+				os.remove(socket_path)
+			server = await asyncio.start_unix_server(self.handle, path = socket_path)
+			print("Serving on {}".format(socket_path))
+		else:
+			server = await asyncio.start_server(self.handle, host, port)
+			print("Serving on http://{}:{}".format(host, port))
+		try:
+			async with server:
+				await server.serve_forever()
+		finally:
+			batcher.cancel()
+			self.executor.shutdown()
+
+def main():
+	system = System()
+	system.parser.add_argument("--host", help = "Host to Serve on", default = "127.0.0.1")
+	system.parser.add_argument("--port", help = "Port to Serve on", type = int, default = 8080)
+	system.parser.add_argument("--socket", help = "Unix Socket to Serve on Instead of TCP", default = None)
+	system.parser.add_argument("--max_batch", help = "Largest Number of Requests Predicted Together",
+				type = int, default = 4096)
+	system.parser.add_argument("--max_latency", help = "Longest Time in Milliseconds a Request Waits for its Batch",
+				type = float, default = 2.0)
+	system.parser.add_argument("--checkpoint_key", help = "Episode and Step of the Checkpoint to Serve (Default: Latest)",
+				type = int, nargs = 2, default = None)
+	system.setup_arguments()
+	system.setup_checkpoints()
+	args = system.args
+
+	checkpoint_key = tuple(args.checkpoint_key) if args.checkpoint_key else system.checkpoints.latest()
+	assert checkpoint_key is not None, "No checkpoint found in {}".format(system.checkpoints.root)
+	predictor = Agent(args.input_size, args.layers, args.units, args.output_size, "predict", backend = args.predictor)
+	predictor.set_checkpoints(system.checkpoints, *checkpoint_key)
+	predictor.setup(None, system.checkpoints.root)
+
+	service = BidService(predictor, max_batch = args.max_batch, max_latency = args.max_latency / 1000.0,
+				input_size = args.input_size)
+	try:
+		asyncio.run(service.serve(args.host, args.port, args.socket))
+	except KeyboardInterrupt:
+		pass
+
+if __name__ == "__main__":
+	main()
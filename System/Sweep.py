@@ -0,0 +1,226 @@
+import os
+import sys
+import json
+import itertools
+import subprocess
+from time import time
+from queue import Queue
+from concurrent.futures import ThreadPoolExecutor
+from argparse import ArgumentParser
+
+import numpy as np
+
+system_dir = os.path.dirname(os.path.abspath(__file__))
+
+# Environment variables capping the threads of TensorFlow and the BLAS libraries of a run.
+thread_variables = ["OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "NUMEXPR_NUM_THREADS",
+		"TF_NUM_INTRAOP_THREADS", "TF_NUM_INTEROP_THREADS"]
+
+def sample_parameter(distribution, rng):
+	"""
+	Draws a value from {"choice": [...]}, {"uniform": [low, high]}, {"log_uniform": [low, high]} or {"int": [low, high]}.
+	"""
+	kind, values = list(distribution.items())[0]
+	if kind == "choice":
+		return values[rng.integers(len(values))]
+	if kind == "uniform":
+		return float(rng.uniform(*values))
+	if kind == "log_uniform":
+		return float(np.exp(rng.uniform(np.log(values[0]), np.log(values[1]))))
+	if kind == "int":
+		return int(rng.integers(values[0], values[1] + 1))
+	raise ValueError("Unknown distribution {}".format(kind))
+
+def expand(spec):
+	"""
+	Returns the configurations of a sweep spec: every point of its grid combined with every random sample.
+	A spec looks like {"grid": {"layers": [2, 3], "units": [30, 60]},
+		"random": {"samples": 4, "seed": 0, "parameters": {"epsilon": {"uniform": [0.05, 0.2]}}},
+		"args": {"max_episodes": 2}}, where args are passed unchanged to every run.
+	"""
+	grid = spec.get("grid", {})
+	points = [dict(zip(sorted(grid), values)) for values in itertools.product(*[grid[name] for name in sorted(grid)])]
+
+	samples = [{}]
+	if "random" in spec:
+		rng = np.random.default_rng(spec["random"].get("seed", 0))
+		parameters = spec["random"]["parameters"]
+		samples = [{name: sample_parameter(parameters[name], rng) for name in sorted(parameters)}
+			for _ in range(spec["random"].get("samples", 1))]
+	return [dict(point, **sample) for point in points for sample in samples]
+
+def run_name(config):
+	return "_".join("{}={}".format(name, "{:.4g}".format(value) if isinstance(value, float) else value)
+			for name, value in sorted(config.items()))
+
+def command_line(arguments):
+	"""
+	Turns {"name": value} into System command line arguments (True for flags, lists for nargs).
+	"""
+	line = []
+	for name, value in sorted(arguments.items()):
+		if value is True:
+			line.append("--{}".format(name))
+		elif isinstance(value, list):
+			line += ["--{}".format(name)] + [str(entry) for entry in value]
+		elif value is not False and value is not None:
+			line += ["--{}".format(name), str(value)]
+	return line
+
+def run_arguments(spec, config, run_dir):
+	"""
+	Returns the System arguments of a run. Checkpoints, snapshots, training data and metrics are kept in the run directory,
+	while every run reads the same (memory mapped, read only) raw deal data from the base directory.
+	"""
+	arguments = dict(spec.get("args", {}), **config)
+	arguments.update({"checkpoint_dir": os.path.join(run_dir, "Checkpoints", "{}-{}", "{}-{}"),
+		"data_dir": os.path.join(run_dir, "EpisodeData", "{}-{}", "{}-{}"),
+		"metrics_file": os.path.join(run_dir, "Metrics", "{}-{}.jsonl"),
+		"profile_dir": os.path.join(run_dir, "Profiles", "{}-{}"),
+		"snapshot_dir": os.path.join(run_dir, "Snapshots", "{}-{}")})
+	return command_line(arguments)
+
+def read_status(run_dir):
+	path = os.path.join(run_dir, "status.json")
+	if not os.path.exists(path):
+		return {"status": "pending"}
+	with open(path) as f:
+		return json.load(f)
+
+def write_status(run_dir, status):
+	path = os.path.join(run_dir, "status.json")
+	with open(path + ".partial", "w") as f:
+		json.dump(status, f, indent = 4)
+	os.replace(path + ".partial", path)
+
+def read_score(run_dir):
+	"""
+	Returns the last score recorded by System.test in the metrics of a run.
+	"""
+	records = []
+	metrics_dir = os.path.join(run_dir, "Metrics")
+	for name in sorted(os.listdir(metrics_dir)) if os.path.exists(metrics_dir) else []:
+		with open(os.path.join(metrics_dir, name)) as f:
+			records += [json.loads(line) for line in f if line.strip()]
+	scores = [record for record in records if record.get("mode") == "test" and "score" in record]
+	if not scores:
+		return None
+	return {"score": scores[-1]["score"], "deals": scores[-1]["deals"], "imp_per_deal": scores[-1]["imp_per_deal"]}
+
+class Sweep:
+
+	def __init__(self, spec, sweep_dir, workers = None, threads = 1):
+		"""
+		Runs the configurations of a sweep spec in parallel, each as train.py followed by main.py.
+		Parameters:
+			Necessary:
+				spec: Sweep spec (see expand)
+				sweep_dir: Directory for the runs, their status markers and the leaderboard
+			Optional:
+				workers: Number of runs at a time (Default: as many as the cores allow)
+				threads: Cores, and TF/BLAS threads, per run
+		"""
+		self.spec = spec
+		self.sweep_dir = sweep_dir
+		self.threads = threads
+		cpus = sorted(os.sched_getaffinity(0))
+		workers = min(workers or len(cpus), max(1, len(cpus) // threads))
+		# Every worker owns a disjoint set of cores, handed to the runs it executes.
+		self.slots = Queue()
+		for worker in range(workers):
+			self.slots.put(cpus[worker * threads : (worker + 1) * threads] or cpus)
+		self.workers = workers
+		self.configs = expand(spec)
+
+	def run_dir(self, config):
+		return os.path.join(self.sweep_dir, "runs", run_name(config))
+
+	def execute(self, script, arguments, run_dir, cpus, log):
+		"""
+		Runs a System script pinned to the given cores with taskset, which unlike a preexec_fn is safe
+		to start from the threads of the sweep.
+		"""
+		environment = dict(os.environ, **{variable: str(self.threads) for variable in thread_variables})
+		command = ["taskset", "-c", ",".join(map(str, cpus)), sys.executable, os.path.join(system_dir, script)]
+		with open(os.path.join(run_dir, log), "a") as f:
+			subprocess.check_call(command + arguments, cwd = system_dir, stdout = f, stderr = subprocess.STDOUT,
+						env = environment)
+
+	def run(self, config):
+		"""
+		Trains and tests one configuration on the cores of a free worker. train.py resumes from the snapshot
+		and checkpoints of the run, so a run interrupted earlier continues at the step it stopped after.
+		"""
+		run_dir = self.run_dir(config)
+		if not os.path.exists(run_dir):
+			os.makedirs(run_dir)
+		arguments = run_arguments(self.spec, config, run_dir)
+		cpus = self.slots.get()
+		start = time()
+		try:
+			write_status(run_dir, {"status": "running", "config": config, "cpus": cpus})
+			self.execute("train.py", arguments, run_dir, cpus, "train.log")
+			self.execute("main.py", arguments, run_dir, cpus, "test.log")
+			status = dict({"status": "done", "config": config, "seconds": time() - start}, **(read_score(run_dir) or {}))
+		except subprocess.CalledProcessError as error:
+			status = {"status": "failed", "config": config, "seconds": time() - start, "error": str(error)}
+		finally:
+			self.slots.put(cpus)
+		write_status(run_dir, status)
+		return status
+
+	def leaderboard(self):
+		"""
+		Writes the finished runs ranked by IMP per deal to leaderboard.json and returns them.
+		"""
+		runs = []
+		for config in self.configs:
+			status = read_status(self.run_dir(config))
+			if status["status"] == "done" and status.get("imp_per_deal") is not None:
+				runs.append(dict(status, run = run_name(config)))
+		runs = sorted(runs, key = lambda run: -run["imp_per_deal"])
+		path = os.path.join(self.sweep_dir, "leaderboard.json")
+		with open(path + ".partial", "w") as f:
+			json.dump(runs, f, indent = 4)
+		os.replace(path + ".partial", path)
+		return runs
+
+	def start(self):
+		"""
+		Runs every configuration that is not done yet and returns the leaderboard.
+		"""
+		pending = [config for config in self.configs if read_status(self.run_dir(config))["status"] != "done"]
+		print("{} of {} runs done, {} to run on {} workers with {} threads each".format(
+			len(self.configs) - len(pending), len(self.configs), len(pending), self.workers, self.threads))
+		with ThreadPoolExecutor(max_workers = self.workers) as pool:
+			for config, status in zip(pending, pool.map(self.run, pending)):
+				print("{}: {} {}".format(run_name(config), status["status"],
+					"{:.3f} IMP/deal".format(status["imp_per_deal"]) if status.get("imp_per_deal") is not None else ""))
+				self.leaderboard()
+		return self.leaderboard()
+
+def get_arguments_from_command_line():
+	parser = ArgumentParser()
+	parser.add_argument("spec", help = "JSON sweep spec (see Sweep.expand)")
+	parser.add_argument("--sweep_dir", default = None, help = "Directory of the sweep (Default: Sweeps/<spec name>)")
+	parser.add_argument("--workers", type = int, default = None, help = "Runs at a time (Default: cores / threads)")
+	parser.add_argument("--threads", type = int, default = 1, help = "Cores and TF/BLAS threads per run")
+	parser.add_argument("--dry_run", action = "store_true", help = "Only print the runs of the sweep")
+	return parser.parse_args()
+
+def main():
+	args = get_arguments_from_command_line()
+	with open(args.spec) as f:
+		spec = json.load(f)
+	sweep_dir = args.sweep_dir or os.path.join("Sweeps", os.path.splitext(os.path.basename(args.spec))[0])
+	sweep = Sweep(spec, os.path.abspath(sweep_dir), args.workers, args.threads)
+	if args.dry_run:
+		for config in sweep.configs:
+			print("{} {}".format(run_name(config), " ".join(run_arguments(spec, config, sweep.run_dir(config)))))
+		return
+
+	for rank, run in enumerate(sweep.start()):
+		print("{:>3}. {:<50} {:8.3f} IMP/deal".format(rank + 1, run["run"], run["imp_per_deal"]))
+
+if __name__ == "__main__":
+	main()
@@ -1,8 +1,11 @@
 import os
+from time import time
 from argparse import ArgumentParser
-from operator import itemgetter
+
+import numpy as np
 
 from Actors import *
+from Metrics import Metrics
 
 class System:
 
@@ -17,28 +20,40 @@ class System:
 		self.predictor = None
 		self.bandit = None
 		self.trainer = None
+		self.writer = None
+		self.synced = False
+		self.checkpoints = None
+		self.metrics = None
+		self.replay = None
+		self.prefetcher = None
+		self.end_episode = None
+		self.seed = None
+		self.deterministic = False
+		self.snapshots = None
+		self.snapshot = None
 
 
-	def setup_arguments(self):
+	def setup_arguments(self, argv = None):
 		"""
 		Sets up the argument parser.
+		Parses argv if given, and the command line otherwise.
 		"""
 		self.parser.add_argument("--epsilon", help = "Greediness of Bandit",
-					default = 0.1)
+					type = float, default = 0.1)
 		self.parser.add_argument("--input_size", help = "Size of Neural Network Input",
-					default = 88)
+					type = int, default = 88)
 		self.parser.add_argument("--layers", help = "Number of Layers of Neural Network",
-					default = 2)
+					type = int, default = 2)
 		self.parser.add_argument("--units", help = "Number of Units of Neural Network",
-					default = 30)
+					type = int, default = 30)
 		self.parser.add_argument("--output_size", help = "Size of Output of Neural Network",
-					default = 36)
+					type = int, default = 36)
 		self.parser.add_argument("--epochs", help = "Number of Epochs to Train the Agent",
-					default = 10)
+					type = int, default = 10)
 		self.parser.add_argument("--max_steps", help = "Maximum Length of Bidding Sequence",
-					default = 8)
+					type = int, default = 8)
 		self.parser.add_argument("--max_episodes", help = "Maximum Number of Episodes",
-					default = 4)
+					type = int, default = 4)
 		self.parser.add_argument("--base_dir", help = "Path to Base Directory",
 					default = "/scratch/ee/btech/ee3140629/BridgeBidding")
 		self.parser.add_argument("--raw_data_path", help = "Path for Raw Hand Data Relative to Base Directory", 
@@ -47,34 +62,176 @@ class System:
 					default = "EpisodeData/Train/{}-{}/{}-{}")
 		self.parser.add_argument("--checkpoint_dir", help = "Directory String for Checkpoint Data Relative to Base Directory",
 					default = "Checkpoints/Train/{}-{}/{}-{}")
-		self.args = self.parser.parse_args()
+		self.parser.add_argument("--chunks", help = "Number of Raw Data Chunks (Default: All Chunks Found on Disk)",
+					type = int, default = None)
+		self.parser.add_argument("--episode_size", help = "Number of Deals per Episode (Default: One Whole Chunk)",
+					type = int, default = None)
+		self.parser.add_argument("--shuffle", help = "Draw the Deals of an Episode from across All Chunks",
+					action = "store_true")
+		self.parser.add_argument("--checkpoint_interval", help = "Save Checkpoints to Disk Every N Steps (and at the End of Every Episode)",
+					type = int, default = 1)
+		self.parser.add_argument("--keep_checkpoints", help = "Number of Best Checkpoints Kept per Step",
+					type = int, default = 1)
+		self.parser.add_argument("--persist_data", help = "Also Save the Training Data of Every Step on a Background Thread",
+					action = "store_true")
+		self.parser.add_argument("--predictor", help = "Backend of the Predictor",
+					choices = sorted(backends), default = "keras")
+		self.parser.add_argument("--metrics_file", help = "JSONL File for Per-Step Timings Relative to Base Directory",
+					default = "Metrics/Train/{}-{}.jsonl")
+		self.parser.add_argument("--profile", help = "Profile the Phases of Every Step",
+					choices = ["cprofile", "sample"], default = None)
+		self.parser.add_argument("--profile_phases", help = "Phases to Profile (Default: All)",
+					nargs = "+", default = None)
+		self.parser.add_argument("--profile_dir", help = "Directory for Profiles Relative to Base Directory",
+					default = "Metrics/Profiles/{}-{}")
+		self.parser.add_argument("--cold_start", help = "Train Every Step from Freshly Initialised Weights Instead of the Best Weights of the Previous Step",
+					action = "store_true")
+		self.parser.add_argument("--patience", help = "Epochs Without Validation Loss Improvement Before Training Stops (0 Trains All Epochs)",
+					type = int, default = 2)
+		self.parser.add_argument("--min_delta", help = "Smallest Validation Loss Change Counted as an Improvement",
+					type = float, default = 1e-4)
+		self.parser.add_argument("--batch_size", help = "Batch Size of the Trainer",
+					type = int, default = 32)
+		self.parser.add_argument("--input_pipeline", help = "Hand the Training Arrays to Keras or Stream Batches Through tf.data",
+					choices = ["arrays", "dataset"], default = "arrays")
+		self.parser.add_argument("--shuffle_buffer", help = "Rows Shuffled Together by the tf.data Pipeline (Default: All, 0 Does Not Shuffle)",
+					type = int, default = None)
+		self.parser.add_argument("--intra_op_threads", help = "Threads Used Within an Operation by TensorFlow (Default: All Cores)",
+					type = int, default = None)
+		self.parser.add_argument("--inter_op_threads", help = "Operations Run in Parallel by TensorFlow (Default: All Cores)",
+					type = int, default = None)
+		self.parser.add_argument("--no_prefetch", help = "Load the Data of Every Episode When it Starts Instead of in the Background",
+					action = "store_true")
+		self.parser.add_argument("--replay_capacity", help = "Rows Kept in the Experience Replay Buffer (Default: No Replay)",
+					type = int, default = None)
+		self.parser.add_argument("--replay_memory_mb", help = "Memory Budget of the Replay Buffer in MB, Instead of --replay_capacity",
+					type = float, default = None)
+		self.parser.add_argument("--replay_path", help = "Directory for a Memmap Backed Replay Buffer Relative to Base Directory (Default: In Memory)",
+					default = None)
+		self.parser.add_argument("--replay_sample", help = "Replayed Rows Added to the Training Data of Every Step (Default: As Many as the Step Has)",
+					type = int, default = None)
+		self.parser.add_argument("--replay_prioritised", help = "Replay Rows Proportionally to Their Last Prediction Error",
+					action = "store_true")
+		self.parser.add_argument("--replay_alpha", help = "Prioritisation Exponent of the Replay Buffer",
+					type = float, default = 0.6)
+		self.parser.add_argument("--seed", help = "Seed of the Run (Default: Random, or That of the Snapshot Resumed From)",
+					type = int, default = None)
+		self.parser.add_argument("--snapshot_dir", help = "Directory for the Snapshot of the Latest Step Relative to Base Directory",
+					default = "Snapshots/Train/{}-{}")
+		self.parser.add_argument("--no_snapshots", help = "Do Not Snapshot Every Step, Only Resuming from Checkpoints at Episode Boundaries",
+					action = "store_true")
+		self.args = self.parser.parse_args(argv)
+
+
+	def setup_checkpoints(self):
+		"""
+		Sets up the checkpoint manager of the configuration.
+		Checkpoints are kept under the parent of checkpoint_dir, one directory per (episode, step).
+		"""
+		checkpoint_dir = self.args.checkpoint_dir.format(self.args.layers, self.args.units, "{}", "{}")
+		self.checkpoints = CheckpointManager(os.path.join(self.args.base_dir, os.path.dirname(checkpoint_dir)),
+						keep = self.args.keep_checkpoints, step_dir = os.path.basename(checkpoint_dir))
+
+
+	def setup_metrics(self):
+		"""
+		Sets up the per-step timing instrumentation.
+		"""
+		self.metrics = Metrics(os.path.join(self.args.base_dir, self.args.metrics_file.format(self.args.layers, self.args.units)),
+					profile = self.args.profile, profile_phases = self.args.profile_phases,
+					profile_dir = os.path.join(self.args.base_dir, self.args.profile_dir.format(self.args.layers, self.args.units)))
 
 
 	def setup_episode(self):
 		"""
-		Finds last episode trained
+		Finds last episode trained from the checkpoint manifest.
+		"""
+		latest = self.checkpoints.latest()
+		if latest is not None:
+			self.episode, _ = latest
+		self.end_episode = self.episode + self.args.max_episodes
+
+
+	def setup_snapshots(self):
+		"""
+		Sets up the per-step snapshots and the seed of the run.
+		A run that was interrupted in the middle of its episodes keeps the seed of its snapshot, so that it
+		can be resumed (see resume) with the same results. Snapshots older than the latest checkpoint are ignored.
+		The data, bandit and replay streams are seeded with --seed or with snapshots on, which pick a random
+		seed to keep in the snapshot. The backends are only seeded, and made deterministic, with an explicit --seed,
+		so that a default run keeps the faster nondeterministic kernels.
 		"""
-		try:
-			episode_step = [folder.split("-") for folder in os.listdir(
-				os.path.join(self.args.base_dir, "Checkpoints/Train/{}-{}".format(self.args.layers, self.args.units)))]
-			episode_step = [(int(folder[0]), int(folder[1])) for folder in episode_step]
-			episode_step = sorted(episode_step, key = itemgetter(0), reverse = True)
-			episode_step = [folder for folder in episode_step if folder[0] == episode_step[0][0]]
-			episode_step = sorted(episode_step, key = itemgetter(1), reverse = True)
-			episode_step = episode_step[0]
-			self.episode,_ = episode_step
-		except:
-			pass
+		if not self.args.no_snapshots:
+			self.snapshots = SnapshotManager(os.path.join(self.args.base_dir,
+							self.args.snapshot_dir.format(self.args.layers, self.args.units)))
+			self.snapshot = self.snapshots.state()
+		if self.snapshot is not None:
+			latest = self.checkpoints.latest()
+			if latest is not None and latest > (self.snapshot["episode"], self.snapshot["step"] - 1):
+				print("Ignoring snapshot of episode {} step {}, older than checkpoint {}".format(
+					self.snapshot["episode"], self.snapshot["step"], latest))
+				self.snapshot = None
+			elif self.snapshot["episode"] >= self.snapshot["end_episode"] and self.snapshot["step"] >= self.args.max_steps:
+				# The snapshot is of a finished run, which a new run continues from its checkpoints.
+				self.snapshot = None
+		self.deterministic = self.args.seed is not None
+		if self.snapshot is not None:
+			self.seed = self.snapshot["seed"]
+			self.deterministic = self.deterministic or self.snapshot["deterministic"]
+			if self.args.seed is not None and self.args.seed != self.seed:
+				print("Resuming with seed {} of the snapshot instead of --seed {}".format(self.seed, self.args.seed))
+		elif self.args.seed is not None:
+			self.seed = self.args.seed
+		elif self.snapshots is not None:
+			self.seed = int(np.random.SeedSequence().generate_state(1)[0])
+
+
+	def stream_seed(self, stream):
+		"""
+		Returns the seed of one of the random streams of the run, or None if the run is not seeded.
+		"""
+		if self.seed is None:
+			return None
+		return int(np.random.SeedSequence([self.seed, stream]).generate_state(1)[0])
+
+
+	def backend_seed(self, stream):
+		"""
+		Returns the seed of the model of an Agent, or None unless the run is deterministic (see setup_snapshots).
+		"""
+		return self.stream_seed(stream) if self.deterministic else None
 
 
 	def setup_actors(self):
 		"""
 		Sets up the predictor and the trainer
+		Both are given the thread pool sizes, since whichever builds its model first sizes the pools of the process.
 		"""
-		self.predictor = Agent(self.args.input_size, self.args.layers, self.args.units, self.args.output_size, "predict")
-		self.trainer = Agent(self.args.input_size, self.args.layers, self.args.units, self.args.output_size, "train", epochs = self.args.epochs)
-		self.data_manager = DataManager(os.path.join(self.args.base_dir, self.args.raw_data_path))
-		self.bandit = EpsilonBandit(self.args.epsilon)
+		self.predictor = Agent(self.args.input_size, self.args.layers, self.args.units, self.args.output_size, "predict",
+					backend = self.args.predictor, intra_op_threads = self.args.intra_op_threads,
+					inter_op_threads = self.args.inter_op_threads, seed = self.backend_seed(0))
+		self.trainer = Agent(self.args.input_size, self.args.layers, self.args.units, self.args.output_size, "train",
+					epochs = self.args.epochs, warm_start = not self.args.cold_start,
+					patience = self.args.patience or None, min_delta = self.args.min_delta,
+					batch_size = self.args.batch_size, input_pipeline = self.args.input_pipeline,
+					shuffle_buffer = self.args.shuffle_buffer, intra_op_threads = self.args.intra_op_threads,
+					inter_op_threads = self.args.inter_op_threads, seed = self.backend_seed(1))
+		if self.args.persist_data:
+			self.writer = AsyncWriter()
+		self.data_manager = DataManager(os.path.join(self.args.base_dir, self.args.raw_data_path),
+						chunks = self.args.chunks, episode_size = self.args.episode_size,
+						shuffle = self.args.shuffle, writer = self.writer, seed = self.stream_seed(2))
+		self.bandit = EpsilonBandit(self.args.epsilon, rng = np.random.default_rng(self.stream_seed(3)))
+		if not self.args.no_prefetch:
+			self.prefetcher = ChunkPrefetcher(self.data_manager)
+		if self.args.replay_capacity or self.args.replay_memory_mb:
+			replay_path = None
+			if self.args.replay_path:
+				replay_path = os.path.join(self.args.base_dir, self.args.replay_path.format(self.args.layers, self.args.units))
+			self.replay = ReplayBuffer(self.args.input_size, self.args.output_size, capacity = self.args.replay_capacity,
+						memory_mb = self.args.replay_memory_mb, path = replay_path,
+						prioritised = self.args.replay_prioritised, alpha = self.args.replay_alpha,
+						rng = np.random.default_rng(self.stream_seed(4)))
 
 
 	def setup(self):
@@ -82,16 +239,105 @@ class System:
 		Sets up the neural networks for the agent.
 		"""
 		self.setup_arguments()
+		self.setup_checkpoints()
+		self.setup_metrics()
 		self.setup_episode()
+		self.setup_snapshots()
 		self.setup_actors()
 
 
-	def episode_step(self):
+	def resume(self):
+		"""
+		Restores the state of the step the snapshot was taken after: the episode and step counters, the deals and
+		bidding sequences of the episode, the bandit and replay buffer RNGs and the best weights of the trainer.
+		Returns whether a snapshot was resumed from. Running the remaining steps (see train.py) then gives
+		the same results as the run that was interrupted, provided the replay buffer, if any, is memmap backed.
+		"""
+		if self.snapshot is None:
+			return False
+		state = self.snapshot
+		arrays = self.snapshots.arrays()
+		self.episode, self.step, self.end_episode = state["episode"], state["step"], state["end_episode"]
+		self.bandit.rng.bit_generator.state = state["bandit_rng"]
+		if state["weights"]:
+			self.trainer.best_weights = [arrays["weights_{}".format(idx)] for idx in range(state["weights"])]
+		if self.replay is not None and state["replay"] is not None:
+			if self.replay.path is not None:
+				self.replay.restore_state(state["replay"])
+			else:
+				print("The replay buffer was held in memory and restarts empty")
+		if self.step < self.args.max_steps:
+			self.data_manager.restore({key[len("data_"):]: array for key, array in arrays.items() if key.startswith("data_")})
+		if self.prefetcher is not None and self.episode < self.end_episode:
+			self.prefetcher.prefetch(self.episode)
+		print("Resuming episode {} at step {}".format(self.episode, self.step))
+		return True
+
+
+	def save_snapshot(self, step):
+		"""
+		Snapshots the state the run resumes at from the given step of the current episode (see resume),
+		adding its size to the metrics of the step.
+		"""
+		if self.snapshots is None:
+			return
+		weights = self.trainer.best_weights or []
+		state = {"episode": self.episode, "step": step, "end_episode": self.end_episode, "seed": self.seed,
+			"deterministic": self.deterministic,
+			"bandit_rng": self.bandit.rng.bit_generator.state, "weights": len(weights),
+			"checkpoint": self.checkpoints.latest(), "replay": None}
+		arrays = {"weights_{}".format(idx): weight for idx, weight in enumerate(weights)}
+		if self.replay is not None:
+			self.replay.flush()
+			state["replay"] = self.replay.state()
+		if step < self.args.max_steps:
+			arrays.update({"data_{}".format(key): array for key, array in self.data_manager.snapshot().items()})
+		self.metrics.annotate(snapshot_bytes = self.snapshots.save(state, arrays))
+
+
+	def close(self):
+		"""
+		Waits for the training data still being persisted, writes the profiles, flushes the replay buffer
+		and stops the prefetcher.
+		"""
+		if self.writer is not None:
+			self.writer.close()
+			self.writer = None
+		if self.metrics is not None:
+			self.metrics.close()
+		if self.replay is not None:
+			self.replay.flush()
+		if self.prefetcher is not None:
+			self.prefetcher.close()
+			self.prefetcher = None
+
+
+	def get_data_path(self):
+		"""
+		Returns the directory the training data of the current step is persisted to, or None.
+		"""
+		if not self.args.persist_data:
+			return None
+		return os.path.join(self.args.base_dir, 
+				self.args.data_dir.format(self.args.layers, self.args.units, self.episode, self.step))
+
+
+	def episode_step(self, prefetch_next = True):
 		"""
 		Sets the stage for the next episode.
+		With the prefetcher, the data of the episode has been read in the background during the previous one,
+		and the data of the following episode (if it is trained on and prefetch_next) starts being read now.
+		The read and the wait times are recorded with the first step of the episode.
 		"""
 		print("Starting Episode {}".format(self.episode))
-		self.data_manager.load(self.episode)
+		with self.metrics.phase("load"):
+			if self.prefetcher is not None:
+				self.data_manager.assign(self.prefetcher.get(self.episode))
+				self.metrics.annotate(**self.prefetcher.stats)
+			else:
+				self.data_manager.load(self.episode)
+		if self.prefetcher is not None and prefetch_next and self.episode + 1 < self.end_episode:
+			self.prefetcher.prefetch(self.episode + 1)
 		self.episode = self.episode + 1
 		self.step = 0
 
@@ -100,78 +346,178 @@ class System:
 		"""
 		Takes a step in the bidding sequence.
 		"""
-		data_path = os.path.join(self.args.base_dir, 
-				self.args.data_dir.format(self.args.layers, self.args.units, self.episode, self.step))
-		if self.step == 0:
-			checkpoint_path = os.path.join(self.args.base_dir, 
-						self.args.checkpoint_dir.format(self.args.layers, self.args.units, self.episode - 1, self.args.max_steps - 1))
-		else:
-			checkpoint_path = os.path.join(self.args.base_dir,
-						self.args.checkpoint_dir.format(self.args.layers, self.args.units, self.episode, self.step - 1))
-
-		self.predictor.setup(data_path, checkpoint_path)
-		self.data_manager.pre_step(self.step, data_path)
-		predictions = self.predictor.predict_model(self.data_manager.X)
-		self.data_manager.PrevBid = self.bandit.decision(predictions, self.data_manager.PrevBid)
-		self.data_manager.post_step()
+		data_path = self.get_data_path()
+		checkpoint_key = self.previous_checkpoint_key()
+		checkpoint_path = os.path.join(self.args.base_dir,
+					self.args.checkpoint_dir.format(self.args.layers, self.args.units, *checkpoint_key))
+
+		with self.metrics.phase("model_setup"):
+			self.predictor.set_checkpoints(self.checkpoints, *checkpoint_key)
+			self.predictor.setup(data_path, checkpoint_path, load_checkpoint = False)
+		if not self.synced and self.trainer.best_weights is not None:
+			# Resumed from a snapshot: bid with the weights the interrupted run would have synced.
+			self.predictor.set_weights(self.trainer.best_weights)
+			self.synced = True
+		if not self.synced:
+			with self.metrics.phase("checkpoint_load"):
+				self.predictor.load_best_checkpoint()
+		with self.metrics.phase("pre_step"):
+			self.data_manager.pre_step(self.step, data_path)
+		with self.metrics.phase("predict_model"):
+			predictions = self.predictor.predict_model(self.data_manager.X)
+		with self.metrics.phase("bandit_decision"):
+			bids = self.bandit.decision(predictions, self.data_manager.PrevBid)
+		with self.metrics.phase("post_step"):
+			self.data_manager.advance(bids)
 
 	
 	def train_step(self):
 		"""
 		Trains the model after the given step.
+		The training data is handed over in memory from the data manager, and the best weights
+		are handed over in memory to the predictor.
+		With a replay buffer, rows replayed from earlier steps are trained on as well, and the step is added to it.
 		"""	
-		data_path = os.path.join(self.args.base_dir, 
-					self.args.data_dir.format(self.args.layers, self.args.units, self.episode, self.step))
 		checkpoint_path = os.path.join(self.args.base_dir, 
 					self.args.checkpoint_dir.format(self.args.layers, self.args.units, self.episode, self.step))
-		self.trainer.setup(data_path, checkpoint_path)
-		self.trainer.train_model()
+		X, Y = self.data_manager.train_data
+		replayed = None
+		val_rows = None
+		if self.replay is not None:
+			with self.metrics.phase("replay"):
+				if len(self.replay) > 0:
+					replayed = self.replay.sample(self.args.replay_sample or len(X))
+				self.replay.add(X, Y)
+				if replayed is not None:
+					# The replayed rows go before the validation rows of the step, so that validation,
+					# early stopping and checkpoint ranking measure the current step.
+					val_rows = int(len(X) * self.trainer.val_split)
+					split = len(X) - val_rows
+					X = np.concatenate([X[:split], replayed[0], X[split:]])
+					Y = np.concatenate([Y[:split], replayed[1], Y[split:]])
+		with self.metrics.phase("model_setup"):
+			self.trainer.set_checkpoints(self.checkpoints, self.episode, self.step)
+			self.trainer.setup(None, checkpoint_path, X, Y, val_rows = val_rows)
+			if not self.args.cold_start and self.trainer.best_weights is None:
+				# Nothing trained in this process yet: warm start from the checkpoint the predictor bid with.
+				self.trainer.load_warm_start(self.checkpoints, *self.previous_checkpoint_key())
+		fit_start = time()
+		with self.metrics.phase("fit"):
+			self.trainer.train_model(save_checkpoints = self.save_checkpoint_step())
+		self.record_epochs(time() - fit_start)
+		with self.metrics.phase("weight_sync"):
+			self.predictor.set_weights(self.trainer.get_weights())
+		self.synced = True
+		if replayed is not None and self.replay.prioritised:
+			with self.metrics.phase("replay"):
+				replay_X, replay_Y, indices = replayed
+				errors = np.mean(np.abs(self.predictor.predict_model(replay_X) - replay_Y), axis = 1)
+				self.replay.update_priorities(indices, errors + 1e-3)
+
+
+	def previous_checkpoint_key(self):
+		"""
+		Returns the (episode, step) of the checkpoint preceding the current step.
+		"""
+		if self.step == 0:
+			return self.episode - 1, self.args.max_steps - 1
+		return self.episode, self.step - 1
+
+
+	def record_epochs(self, fit_seconds):
+		"""
+		Adds the epochs used by the last training run, the epochs and estimated time early stopping saved
+		and the training throughput to the metrics of the step, with whether training was deterministic
+		and the time seeding it took.
+		"""
+		epochs_used = self.trainer.epochs_used
+		if not epochs_used:
+			return
+		self.metrics.annotate(deterministic = self.trainer.seed is not None, seed_seconds = self.trainer.seed_seconds)
+		epochs_saved = self.args.epochs - epochs_used
+		self.metrics.annotate(epochs_used = epochs_used, epochs_saved = epochs_saved,
+				fit_seconds_saved = fit_seconds / epochs_used * epochs_saved,
+				samples_per_second = self.trainer.samples_per_second)
+
+
+	def save_checkpoint_step(self):
+		"""
+		Whether the checkpoints of the current step are saved to disk.
+		The last step of an episode is always saved, since that is where training resumes from.
+		"""
+		return (self.step + 1) % self.args.checkpoint_interval == 0 or self.step == self.args.max_steps - 1
 
 
 	def complete_step(self):
 		"""
-		Takes a step in the bidding sequence and trains the model.
+		Takes a step in the bidding sequence, trains the model and snapshots the state the run resumes at.
 		"""
 		print("\tStarting Step {}".format(self.step))
+		active_deals = len(self.data_manager.active)
 		self.bid_step()
 		self.train_step()
+		with self.metrics.phase("snapshot"):
+			self.save_snapshot(self.step + 1)
+		self.metrics.record(mode = "train", episode = self.episode, step = self.step, active_deals = active_deals,
+				completed_deals = active_deals - len(self.data_manager.active),
+				replay_rows = len(self.replay) if self.replay is not None else None)
 		self.step = self.step + 1
 
 	def test(self):
 		"""
-		Takes the steps in the bidding sequence for a given set of data points.
+		Takes the steps in the bidding sequence for a given set of data points and returns the score.
+		The score is also recorded, with the IMP per deal, in the metrics of the last step.
+		See Evaluate.py for evaluating all chunks in parallel.
 		"""
 		import numpy as np
 
 		score = 0
 
-		def score_completed_sequences(predictions):
-			completed_idx_mask = np.logical_or(self.data_manager.PrevBid == 35, self.data_manager.PrevBid == 0)
-			IMP = self.data_manager.IMP[completed_idx_mask]
- 			pred = predictions[completed_idx_mask]
-			return np.sum(IMP[range(IMP.shape[0]), [int(predx) for predx in pred]])
+		# Bids are scored against the IMP targets of their step, gathered by pre_step before the bids are
+		# recorded: the IMP property penalises every bid below the latest recorded bid, the new one included.
+		def score_completed_sequences(IMP, predictions):
+			completed_idx_mask = np.logical_or(predictions == 35, predictions == 0)
+			IMP = IMP[completed_idx_mask]
+			pred = np.asarray(predictions[completed_idx_mask], dtype = int)
+			return np.sum(IMP[np.arange(IMP.shape[0]), pred])
 
-		def score_remaining_sequences(predictions):
-			IMP = self.data_manager.IMP
- 			pred = predictions
-			return np.sum(IMP[range(IMP.shape[0]), [int(predx) for predx in pred]])
+		def score_remaining_sequences(IMP, predictions):
+			pred = np.asarray(predictions, dtype = int)
+			return np.sum(IMP[np.arange(IMP.shape[0]), pred])
 
-		data_path = os.path.join(self.args.base_dir, 
-				self.args.data_dir.format(self.args.layers, self.args.units, self.episode, self.step))
+		data_path = self.get_data_path()
 		checkpoint_path = os.path.join(self.args.base_dir,
 				self.args.checkpoint_dir.format(self.args.layers, self.args.units, self.episode - 1, self.args.max_steps - 1))
-		self.predictor.setup(data_path, checkpoint_path)
+		with self.metrics.phase("model_setup"):
+			self.predictor.set_checkpoints(self.checkpoints, self.episode - 1, self.args.max_steps - 1)
+			self.predictor.setup(data_path, checkpoint_path, load_checkpoint = False)
+		with self.metrics.phase("checkpoint_load"):
+			self.predictor.load_best_checkpoint()
 
-		for _ in range(self.args.max_steps - 1):
-			self.data_manager.pre_step(self.step, data_path)
-			predictions = self.predictor.predict_model(self.data_manager.X)
-			self.data_manager.PrevBid = self.bandit.decision(predictions, self.data_manager.PrevBid)
-			score += score_completed_sequences(self.data_manager.PrevBid)
-			self.data_manager.post_step()
+		def bid(step):
+			active_deals = len(self.data_manager.active)
+			with self.metrics.phase("pre_step"):
+				self.data_manager.pre_step(step, data_path)
+			with self.metrics.phase("predict_model"):
+				predictions = self.predictor.predict_model(self.data_manager.X)
+			with self.metrics.phase("bandit_decision"):
+				self.data_manager.PrevBid = self.bandit.decision(predictions, self.data_manager.PrevBid)
+			return active_deals
+
+		deals = len(self.data_manager.active)
+		for step in range(self.args.max_steps - 1):
+			active_deals = bid(step)
+			score += score_completed_sequences(self.data_manager.train_data[1], self.data_manager.PrevBid)
+			with self.metrics.phase("post_step"):
+				self.data_manager.post_step()
+			self.metrics.record(mode = "test", episode = self.episode, step = step, active_deals = active_deals,
+					completed_deals = active_deals - len(self.data_manager.active))
 
-		self.data_manager.pre_step(self.step, data_path)
-		predictions = self.predictor.predict_model(self.data_manager.X)
-		self.data_manager.PrevBid = self.bandit.decision(predictions, self.data_manager.PrevBid)
-		score += score_remaining_sequences(self.data_manager.PrevBid)
+		active_deals = bid(self.args.max_steps - 1)
+		score += score_remaining_sequences(self.data_manager.train_data[1], self.data_manager.PrevBid)
+		self.metrics.record(mode = "test", episode = self.episode, step = self.args.max_steps - 1,
+				active_deals = active_deals, completed_deals = active_deals, deals = deals, score = float(score),
+				imp_per_deal = float(score) / deals * 48 - 24 if deals else None)
 
-		print(score / 10000)	
+		print(score / 10000)
+		return score
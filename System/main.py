@@ -3,5 +3,7 @@ from System import System
 system = System()
 system.setup()
 
-system.episode_step()
+system.episode_step(prefetch_next = False)
 system.test()
+
+system.close()
@@ -3,7 +3,14 @@ from System import System
 system = System()
 system.setup()
 
-for episode in range(system.args.max_episodes):
+# A run interrupted in the middle of an episode continues at the step after its snapshot.
+if system.resume():
+	while system.step < system.args.max_steps:
+		system.complete_step()
+
+while system.episode < system.end_episode:
 	system.episode_step()
 	for step in range(system.args.max_steps):
 		system.complete_step()
+
+system.close()
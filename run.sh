@@ -11,19 +11,12 @@ cp GeneratingData/dds/src/libdds.a GeneratingData
 echo "Compiling"
 g++ -O3 -mtune=generic -fopenmp -c ./GeneratingData/DoubleDummy.cpp -o./GeneratingData/DoubleDummy.o
 g++ -O3 -mtune=generic -fopenmp  ./GeneratingData/DoubleDummy.o -L. -ldds -o ./GeneratingData/DoubleDummy
-echo "Making Data Directory"
-[ -d Data ]&&echo "Exists"||mkdir Data
-echo "Copying Executable"
-for i in {0..15}; do cp GeneratingData/DoubleDummy Data/$i; done
-echo "Generating Double Dummy Hands and Tricks"
-for i in {0..15}; do ./Data/$i $(($i * $count)) $count > ./Data/Data-$i.raw & done
-echo "Deleting Executables"
-for i in {0..15}; do rm Data/$i; done
-echo "Cleaning Double Dummy Hands and Tricks"
-for i in {0..15}; do echo $i; python GeneratingData/CleanDoubleDummy.py Data/Data-$i.raw Data/Data-$i.clean; done
-echo "Scoring Hands"
-for i in {0..15}; do echo $i; python GeneratingData/ScoreDoubleDummy.py Data/Data-$i.clean Data/Data-$i.score; done
-echo "Vectorising Hands"
-for i in {0..15}; do echo $i; python GeneratingData/VectoriseDoubleDummy.py Data/Data-$i.score Data/Data-$i.npy; done
+echo "Generating, Cleaning, Scoring and Vectorising Hands"
+python GeneratingData/Orchestrate.py --shards 16 --count $count --data_dir Data --executable GeneratingData/DoubleDummy --cache Data/Cache
 echo "Displaying Sample Output"
+# Only the scored JSON of shard 0 is kept: its vectorised copy goes to a scratch directory, so that
+# Data/Data-0.npy stays the file Orchestrate.py wrote and marked as done.
+scratch=$(mktemp -d)
+python GeneratingData/ProcessDoubleDummy.py Data/Data-0.raw $scratch/Data-0.npy --score_json Data/Data-0.score
+rm -r $scratch
 python GeneratingData/Sample.py Data/Data-0.score